@@ -1,166 +1,227 @@
 #Alarms.py
 import asyncio
 import json
+from collections import namedtuple
 
-import discord
+import zstandard
 from replit.object_storage import Client
+from replit.object_storage.errors import ObjectNotFoundError
 
-from SQ_Info import fetch_squadron_info
+from SQ_Info import Member, Roster, get_roster, roster_points
 
 client = Client()
+
+# Snapshots are Rosters stored as zstd-compressed JSON with the members as two arrays sorted by name.
+# Version 1 was the member embed serialized with to_dict(), load_snapshot() still reads those.
+# Each squadron has one snapshot per region under SNAPSHOTS/SQUADRONS/, the per-guild keys only hold a
+# {"ref": key} pointing at it.
+SNAPSHOT_VERSION = 2
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+RosterDiff = namedtuple("RosterDiff", [
+    "joined", "left", "renamed", "points_changes",
+    "old_total_points", "new_total_points", "old_total_members", "new_total_members",
+])
+
+
 # Function to take a snapshot of the members and their scores
 async def take_snapshot(squadron_name):
-    snapshot = await fetch_squadron_info(squadron_name)
-    return snapshot
+    return await get_roster(squadron_name)
 
-# Function to save the snapshot using Replit object storage
-def save_snapshot(snapshot, guild_id, squadron_name, region=None):
-    if region:
-        key = f"SNAPSHOTS/{guild_id}-{squadron_name}-{region}-snapshot"
-    else:
-        key = f"SNAPSHOTS/{guild_id}-{squadron_name}-snapshot"
-    client.upload_from_text(key, json.dumps(snapshot.to_dict()))
-    print(f"Snapshot saved for {squadron_name} in guild {guild_id} under {region or 'default'} region")
 
-
-# Function to load the snapshot using Replit object storage
-def load_snapshot(guild_id, squadron_name, region=None):
+def snapshot_key(guild_id, squadron_name, region=None):
     if region:
-        key = f"SNAPSHOTS/{guild_id}-{squadron_name}-{region}-snapshot"
-    else:
-        key = f"SNAPSHOTS/{guild_id}-{squadron_name}-snapshot"
-    try:
-        snapshot_dict = json.loads(client.download_as_text(key))
-        return discord.Embed.from_dict(snapshot_dict)
-    except Exception as e:
-        print(f"Error loading snapshot for {squadron_name} in guild {guild_id} under {region or 'default'} region: {e}")
-        return None
-
+        return f"SNAPSHOTS/{guild_id}-{squadron_name}-{region}-snapshot"
+    return f"SNAPSHOTS/{guild_id}-{squadron_name}-snapshot"
 
-def compare_snapshots(old_snapshot, new_snapshot):
-    old_members = {}
-    new_members = {}
-    old_total_members = 0
-    new_total_members = 0
 
-    for field in old_snapshot.fields:
-        if field.name == "Total Members":
+def squadron_snapshot_key(squadron_name, region=None):
+    """Key of the one snapshot per squadron (and region) that every tracking guild's key refers to."""
+    if region:
+        return f"SNAPSHOTS/SQUADRONS/{squadron_name}-{region}-snapshot"
+    return f"SNAPSHOTS/SQUADRONS/{squadron_name}-snapshot"
+
+
+def encode_snapshot(roster):
+    members = sorted(roster.members)
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "squadron": roster.squadron,
+        "fetched_at": roster.fetched_at,
+        "total_points": roster.total_points,
+        "names": [member.name for member in members],
+        "points": [member.points for member in members],
+    }
+    data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return zstandard.ZstdCompressor(level=10).compress(data)
+
+
+def decode_snapshot(data, squadron_name):
+    """Roster from a stored snapshot, either format."""
+    if not data.startswith(ZSTD_MAGIC):
+        return _roster_from_embed(json.loads(data), squadron_name)
+
+    payload = json.loads(zstandard.ZstdDecompressor().decompress(data))
+    if payload.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"unknown snapshot version {payload.get('version')}")
+    members = tuple(Member(name, points) for name, points in zip(payload["names"], payload["points"]))
+    return Roster(payload["squadron"], members, payload["total_points"], payload["fetched_at"])
+
+
+def _roster_from_embed(embed_dict, squadron_name):
+    """Migration reader for version 1 snapshots, parses the member lines back out of the embed fields."""
+    total_points = 0
+    members = []
+    for field in embed_dict.get("fields", []):
+        if field["name"] == "Total Points":
             try:
-                old_total_members = int(field.value)
+                total_points = int(field["value"])
             except ValueError as e:
-                print(f"Error parsing old members: {field.value}, error: {e}")
+                print(f"Error parsing total points: {field['value']}, error: {e}")
 
-    for field in new_snapshot.fields:
-        if field.name == "Total Members":
-            try:
-                new_total_members = int(field.value)
-            except ValueError as e:
-                print(f"Error parsing new members: {field.value}, error: {e}")
-    
-    # Extract old members
-    for field in old_snapshot.fields:
-        if field.name == "\u00a0":
-            values = field.value.split("\n")
-            for value in values:
+        if field["name"] == "\u00a0":  # Member points data
+            for value in field["value"].split("\n"):
                 try:
-                    member_name = value.split(": ")[0].replace('\\_', '_')
-                    points = int(value.split(": ")[1].split()[0])
-                    old_members[member_name] = points
+                    # Split on the last ": " so names containing one survive the migration
+                    member_name, points_text = value.rsplit(": ", 1)
+                    members.append(Member(member_name.replace('\\_', '_'), int(points_text.split()[0])))
                 except (IndexError, ValueError) as e:
                     print(f"Error parsing old snapshot field: {value}, error: {e}")
 
-    # Extract new members
-    for field in new_snapshot.fields:
-        if field.name == "\u00a0":
-            values = field.value.split("\n")
-            for value in values:
-                try:
-                    member_name = value.split(": ")[0].replace('\\_', '_')
-                    points = int(value.split(": ")[1].split()[0])
-                    new_members[member_name] = points
-                except (IndexError, ValueError) as e:
-                    print(f"Error parsing new snapshot field: {value}, error: {e}")
+    # No timestamp was stored before version 2
+    return Roster(squadron_name, tuple(members), total_points, 0)
 
-    
-    if not new_members:
-        return {}, {}
 
+def save_squadron_snapshot(snapshot, squadron_name, region=None):
+    client.upload_from_bytes(squadron_snapshot_key(squadron_name, region), encode_snapshot(snapshot))
+    print(f"Snapshot saved for {squadron_name} under {region or 'default'} region")
 
-    left_members = {}
-    name_changes = {}
 
-    # Create a reverse lookup for new members' points -> name
-    points_to_name = {points: name for name, points in new_members.items()}
+def load_squadron_snapshot(squadron_name, region=None):
+    """The squadron's canonical snapshot, None if there isn't one yet."""
+    try:
+        data = client.download_as_bytes(squadron_snapshot_key(squadron_name, region))
+    except ObjectNotFoundError:
+        return None
+    try:
+        return decode_snapshot(data, squadron_name)
+    except Exception as e:
+        print(f"Error loading snapshot for {squadron_name} under {region or 'default'} region: {e}")
+        return None
 
-    for member, points in old_members.items():
-        if member not in new_members:
-            if points not in points_to_name:    
-                left_members[member] = points
-            else:
-                new_name = points_to_name[points]  # Get the new name based on matching points
-                name_changes[member] = (new_name)  # Store old name -> new name
 
-    return left_members, name_changes
+def link_snapshot(guild_id, squadron_name, region=None):
+    """Points the guild's snapshot key at the squadron's canonical snapshot instead of holding its own copy."""
+    reference = {"ref": squadron_snapshot_key(squadron_name, region)}
+    client.upload_from_text(snapshot_key(guild_id, squadron_name, region), json.dumps(reference))
 
 
+def link_snapshots(guild_id, squadron_name):
+    """
+    link_snapshot() for each alarm region the squadron already has a snapshot in, done when a guild starts
+    tracking a squadron's points. Regions without one keep the guild's own copy, the points alarm diffs
+    against it once and links it after saving the squadron snapshot.
+    """
+    for region in ("EU", "US"):
+        if client.exists(squadron_snapshot_key(squadron_name, region)):
+            link_snapshot(guild_id, squadron_name, region)
 
 
-def compare_points(old_snapshot, new_snapshot):
-    old_members = {}
-    new_members = {}
-    old_total_points = 0
+# Function to save the snapshot using Replit object storage
+def save_snapshot(snapshot, guild_id, squadron_name, region=None):
+    save_squadron_snapshot(snapshot, squadron_name, region)
+    link_snapshot(guild_id, squadron_name, region)
 
-    # Extract old total points & members' points
-    for field in old_snapshot.fields:
-        if field.name == "Total Points":
-            try:
-                old_total_points = int(field.value)
-            except ValueError as e:
-                print(f"Error parsing total points: {field.value}, error: {e}")
 
-        if field.name == "\u00a0":  # Member points data
-            values = field.value.split("\n")
-            for value in values:
-                try:
-                    member_name = value.split(": ")[0].replace('\\_', '_')
-                    points = int(value.split(": ")[1].split()[0])
-                    old_members[member_name] = points
-                except (IndexError, ValueError) as e:
-                    print(f"Error parsing old snapshot field: {value}, error: {e}")
+# Function to load the snapshot using Replit object storage
+def load_snapshot(guild_id, squadron_name, region=None):
+    """The guild's snapshot, following its reference to the canonical one, or its own pre-reference copy."""
+    try:
+        data = client.download_as_bytes(snapshot_key(guild_id, squadron_name, region))
+        if not data.startswith(ZSTD_MAGIC):
+            stored = json.loads(data)
+            if "ref" in stored:
+                data = client.download_as_bytes(stored["ref"])
+        return decode_snapshot(data, squadron_name)
+    except Exception as e:
+        print(f"Error loading snapshot for {squadron_name} in guild {guild_id} under {region or 'default'} region: {e}")
+        return None
 
-    # Extract new members' points
-    for field in new_snapshot.fields:
-        if field.name == "\u00a0":
-            values = field.value.split("\n")
-            for value in values:
-                try:
-                    member_name = value.split(": ")[0].replace('\\_', '_')
-                    points = int(value.split(": ")[1].split()[0])
-                    new_members[member_name] = points
-                except (IndexError, ValueError) as e:
-                    print(f"Error parsing new snapshot field: {value}, error: {e}")
 
-    # Compare old and new points to detect changes
-    points_changes = {}
+def diff_rosters(old_roster, new_roster):
+    """
+    Everything the alarms report about two rosters, worked out in one pass over each.
 
-    # Check existing members
-    for member, old_points in old_members.items():
-        new_points = new_members.get(member, 0)  # If player left, set their points to zero
-        if new_points != old_points:
-            points_changes[member] = (new_points - old_points, new_points)
+    A member missing from the new roster is matched to a new name with the same (non-zero) points
+    and counted as renamed. When several share those points, the old and new names are paired in
+    sorted order so the result doesn't depend on page order. Renamed members aren't reported as
+    left, joined or changed. points_changes is {name: (change, now)}, members who left count as
+    dropping to 0 and new members are only listed if they have points, highest points first.
+    """
+    new_members = roster_points(new_roster)
+    old_members = {}
+    missing = {}  # points -> [old names no longer in the roster]
+    points_changes = []
+    for name, old_points in old_roster.members:
+        old_members[name] = old_points
+        new_points = new_members.get(name)
+        if new_points is None:
+            missing.setdefault(old_points, []).append(name)
+        elif new_points != old_points:
+            points_changes.append((name, new_points - old_points, new_points))
+
+    arrivals = {}  # points -> [new names not in the old roster]
+    for name, new_points in new_roster.members:
+        if name not in old_members:
+            arrivals.setdefault(new_points, []).append(name)
+
+    left, joined, renamed = {}, {}, {}
+    for points in missing.keys() | arrivals.keys():
+        old_names = sorted(missing.get(points, ()))
+        new_names = sorted(arrivals.get(points, ()))
+        # Everyone starts at 0, so equal zeroes say nothing about who is who
+        pairs = min(len(old_names), len(new_names)) if points else 0
+        for old_name, new_name in zip(old_names[:pairs], new_names[:pairs]):
+            renamed[old_name] = new_name
+        for name in old_names[pairs:]:
+            left[name] = points
+            if points:
+                points_changes.append((name, -points, 0))
+        for name in new_names[pairs:]:
+            joined[name] = points
+            if points:
+                points_changes.append((name, points, points))
+
+    points_changes.sort(key=lambda change: (-change[2], change[0]))
+    return RosterDiff(
+        joined=joined,
+        left=left,
+        renamed=renamed,
+        points_changes={name: (change, now) for name, change, now in points_changes},
+        old_total_points=old_roster.total_points,
+        new_total_points=new_roster.total_points,
+        old_total_members=len(old_members),
+        new_total_members=len(new_members),
+    )
+
+
+def compare_snapshots(old_snapshot, new_snapshot):
+    """(left members {name: points}, renames {old name: new name}), nothing if the new roster is empty."""
+    if not new_snapshot.members:
+        return {}, {}
+    diff = diff_rosters(old_snapshot, new_snapshot)
+    return diff.left, diff.renamed
 
-    # Check new members not in old_members
-    for member, new_points in new_members.items():
-        if member not in old_members:  # New player
-            if new_points != 0: #Only include them if they made points
-                points_changes[member] = (new_points, new_points)
 
-    return points_changes, old_total_points
+def compare_points(old_snapshot, new_snapshot):
+    diff = diff_rosters(old_snapshot, new_snapshot)
+    return diff.points_changes, diff.old_total_points
 
 
 
 async def main():
-    embed = await take_snapshot("IC0N")
-    print(json.dumps(embed.to_dict(), indent=4))
+    roster = await take_snapshot("IC0N")
+    print(roster)
+    print(decode_snapshot(encode_snapshot(roster), "IC0N"))
 
-#asyncio.run(main())
\ No newline at end of file
+#asyncio.run(main())
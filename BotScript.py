@@ -1,6 +1,7 @@
 # Standard Library Imports
 import asyncio
 import datetime as DT
+import io
 import json
 import logging
 import math
@@ -25,12 +26,14 @@ from replit.object_storage.errors import ObjectNotFoundError
 
 # Local Module Imports
 import Alarms
+import HTTP_Client
+import Points_History
 from AutoLog import fetch_games_for_user
-from Data_Parser import LangTableReader, get_dict_from_list
-from Leaderboard_Parser import get_top_20, search_for_clan
+from Data_Parser import LangTableReader, get_dict_from_list, load_languages
+from Leaderboard_Parser import clan_stats, get_top_20, load_leaderboard_snapshot, search_for_clan, start_refresher
 from Parse_Replay import get_basic_replay_info, save_replay_data
-from Scoreboard import create_scoreboard
-from SQ_Info import fetch_squadron_info
+from Scoreboard import SCOREBOARD_FORMATS, create_scoreboards, get_scoreboard_upload, shutdown_render_pool
+from SQ_Info import fetch_squadron_info, get_rosters
 
 logging.basicConfig(level=logging.INFO)
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -40,6 +43,11 @@ logging.getLogger("deepl").setLevel(logging.WARNING)
 client = Client(bucket_id="replit-objstore-b5261a8a-c768-4543-975e-dfce1cd7077d")
 TOKEN = os.environ.get('DISCORD_KEY')
 
+# Points alarm: object storage calls in flight at once, and channel messages being sent at once
+# (discord.py waits out Discord's own rate limits on top of this)
+ALARM_IO_CONCURRENCY = 8
+ALARM_SEND_CONCURRENCY = 5
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.reactions = True
@@ -56,6 +64,11 @@ class MyBot(commands.Bot):
         await self.tree.sync()
         self.synced = True
 
+    async def close(self):
+        shutdown_render_pool()
+        await HTTP_Client.close_session()
+        await super().close()
+
 bot = MyBot()
 
 
@@ -80,10 +93,19 @@ async def on_ready():
         logging.error(f"Error wiping replays in startup: {e}")
 
     try:
-        await search_for_clan("AVR")
-        logging.info("Initialized cache . . .")
+        # Parsing units.csv after a game update takes a while, do it now and off the event loop
+        await load_languages(["<English>"])
+        logging.info("Loaded vehicle names . . .")
+    except Exception as e:
+        logging.error(f"Error loading vehicle names in startup: {e}")
+
+    try:
+        # Serve lookups from the last snapshot right away, the refresher revalidates it in the background
+        await load_leaderboard_snapshot()
+        start_refresher()
+        logging.info("Started leaderboard cache refresher . . .")
     except Exception as e:
-        logging.error(f"Error initializing cache in startup: {e}")
+        logging.error(f"Error starting leaderboard refresher in startup: {e}")
 
     try:
         points_alarm_task.start()
@@ -158,122 +180,218 @@ async def before_replay_cleaning_task():
 async def points_alarm_task():
     now_utc = datetime.now(timezone.utc).time()
 
+    region = None
     if now_utc.hour == 22 and now_utc.minute == 30:
         region = "EU"
-        await execute_points_alarm_task(region)
     elif now_utc.hour == 7 and now_utc.minute == 30:
         region = "US"
-        await execute_points_alarm_task(region)
 
+    if region:
+        # An unhandled error would stop the loop, and with it every later alarm
+        try:
+            await execute_points_alarm_task(region)
+        except Exception as e:
+            logging.error(f"(POINTS) {region} alarm run failed: {e}")
+
+
+def build_points_embed(squadron_name, region, diff):
+    changes_lines = []
+
+    for member, (points_change, current_points) in diff.points_changes.items():
+        arrow = "🌲" if points_change > 0 else "🔻"
+        member_str = f"{member:<20}"[:20]  # Limit name to 20 characters
+        change_str = f"{arrow} {abs(points_change):<5}"  # Change column width of 5
+        current_points_str = f"{current_points:>8}"  # Right-aligned 8 width
+        changes_lines.append(f"{member_str}{change_str}{current_points_str}")
+
+    # Chunk the lines into sections that fit within the max_field_length limit
+    max_field_length = 1024
+    chunks = []
+    current_chunk = "```\nName                Change       Now\n"
+    for line in changes_lines:
+        if len(current_chunk) + len(line) + 1 > max_field_length:
+            current_chunk += "```"
+            chunks.append(current_chunk)
+            current_chunk = "```\n" + line + "\n"
+        else:
+            current_chunk += line + "\n"
 
-async def execute_points_alarm_task(region):
-    await cleanup_replays()
-    logging.info("Running points-update alarm")
-    for guild in bot.guilds:
-        guild_id = guild.id
-        guild_name = guild.name
-        key = f"PREFERENCES/{guild_id}-preferences.json"
+    # Add any remaining text in the last chunk
+    if current_chunk:
+        current_chunk += "```"
+        chunks.append(current_chunk)
 
-        logging.info(f"(POINTS) Processing guild: {guild_id} for region: {region}")
+    old_total_points, sq_total_points = diff.old_total_points, diff.new_total_points
+    chart = "📈" if old_total_points < int(sq_total_points) else "📉"
+    embed = discord.Embed(
+        title=
+        f"**{squadron_name} {region} Points Update**",
+        description=
+        f"# **Point Change:** {old_total_points} -> {sq_total_points} {chart}\n\n**Player Changes:**",
+        color=discord.Color.blue())
 
-        try:
-            data = client.download_as_text(key)
-            preferences = json.loads(data)
-            logging.info(f"(POINTS) Successfully loaded preferences for guild: {guild_id}")
-            
-        except (ObjectNotFoundError, FileNotFoundError):
-            preferences = {}
+    for chunk in chunks:
+        embed.add_field(name="\u200A", value=chunk, inline=False)
+    embed.set_footer(text="Meow :3")
+    return embed
 
-        for squadron_name, squadron_preferences in preferences.items():
-            logging.info(f"(POINTS) Checking squadron: {squadron_name} for points alarm")
 
-            squadron_info = await fetch_squadron_info(squadron_name, embed_type="points")
-            if squadron_info.fields and squadron_info.fields[0].value:
-                sq_total_points = int(squadron_info.fields[0].value.replace(",", ""))
-            else:
-                sq_total_points = 0  # Default value if no valid data
+async def send_points_update(guild, squadron_name, channel_value, embed):
+    try:
+        channel_id = int(channel_value.strip("<#>"))
+    except Exception:
+        logging.error(f"(POINTS) Failed to get channel ID in {guild.name} ({guild.id}), skipping")
+        return
 
-            logging.info(f"{squadron_name} points at {sq_total_points}.")
+    if channel_id <= 0:
+        logging.error(f"(POINTS) Invalid channel ID format: {channel_id} for squadron {squadron_name} in {guild.name} ({guild.id})")
+        return
 
-            if "Points" in squadron_preferences:
-                opposite_region = "EU" if region == "US" else "US"
-                old_snapshot = Alarms.load_snapshot(guild_id, squadron_name, opposite_region)
-                new_snapshot = await Alarms.take_snapshot(squadron_name)
-
-                if old_snapshot:
-                    points_changes, old_total_points = Alarms.compare_points(old_snapshot, new_snapshot)
-
-                    if points_changes:
-                        channel_id = squadron_preferences.get("Points", "")
-                        try:
-                            channel_id = int(channel_id.strip("<#>"))
-                        except Exception:
-                            logging.error(f"(POINTS) Failed to get channel ID in {guild_name} ({guild_id}), skipping")
-                            continue
-                            
-                        if channel_id > 0:
-                            channel = bot.get_channel(channel_id)
-                            if channel:
-                                logging.info(f"(POINTS) Sending points update to channel {channel_id} for squadron {squadron_name}")
-
-                                changes_lines = []
-
-                                for member, (points_change, current_points) in points_changes.items():
-                                    arrow = "🌲" if points_change > 0 else "🔻"
-                                    member_str = f"{member:<20}"[:20]  # Limit name to 20 characters
-                                    change_str = f"{arrow} {abs(points_change):<5}"  # Change column width of 5
-                                    current_points_str = f"{current_points:>8}"  # Right-aligned 8 width
-                                    changes_lines.append(f"{member_str}{change_str}{current_points_str}")
-
-                                # Chunk the lines into sections that fit within the max_field_length limit
-                                max_field_length = 1024
-                                chunks = []
-                                current_chunk = "```\nName                Change       Now\n"
-                                for line in changes_lines:
-                                    if len(current_chunk) + len(line) + 1 > max_field_length:
-                                        current_chunk += "```"
-                                        chunks.append(current_chunk)
-                                        current_chunk = "```\n" + line + "\n"
-                                    else:
-                                        current_chunk += line + "\n"
-
-                                # Add any remaining text in the last chunk
-                                if current_chunk:
-                                    current_chunk += "```"
-                                    chunks.append(current_chunk)
-
-                                chart = "📈" if old_total_points < int(sq_total_points) else "📉"
-                                embed = discord.Embed(
-                                    title=
-                                    f"**{squadron_name} {region} Points Update**",
-                                    description=
-                                    f"# **Point Change:** {old_total_points} -> {sq_total_points} {chart}\n\n**Player Changes:**",
-                                    color=discord.Color.blue())
-
-                                for chunk in chunks:
-                                    embed.add_field(name="\u200A", value=chunk, inline=False)
-                                embed.set_footer(text="Meow :3")
-
-                                
-                                try:
-                                    await channel.send(embed=embed)
-                                    logging.info(f"(POINTS) Points update sent successfully for {squadron_name} in {guild_id}")
-
-                                except Exception as e:
-                                    logging.error(f"(POINTS) Error sending points update to {guild_name} ({guild_id}): {e}")
-                                    continue
+    channel = bot.get_channel(channel_id)
+    if not channel:
+        logging.error(f"(POINTS) Channel ID {channel_id} not found for guild {guild.id}")
+        return
 
-                            else:
-                                logging.error(f"(POINTS) Channel ID {channel_id} not found for guild {guild_id}")
-                        else:
-                            logging.error(f"(POINTS) Invalid channel ID format: {channel_id} for squadron {squadron_name} in {guild_name} ({guild_id})")
-                    else:
-                        logging.info(f"(POINTS) No new points for {squadron_name}")
+    logging.info(f"(POINTS) Sending points update to channel {channel_id} for squadron {squadron_name}")
+    try:
+        await channel.send(embed=embed)
+        logging.info(f"(POINTS) Points update sent successfully for {squadron_name} in {guild.id}")
+    except Exception as e:
+        logging.error(f"(POINTS) Error sending points update to {guild.name} ({guild.id}): {e}")
+
+
+async def _bounded_gather(limit, jobs, default=None):
+    """
+    Runs the (label, coroutine) jobs with at most `limit` at once and returns their results in order.
+    A job that raises is logged and gives `default`, so one bad guild or squadron can't sink the others.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(label, coro):
+        async with semaphore:
+            try:
+                return await coro
+            except Exception as e:
+                logging.error(f"(POINTS) {label} failed: {e}")
+                return default
+
+    return await asyncio.gather(*[run(label, coro) for label, coro in jobs])
+
+
+async def diff_squadron_points(squadron_name, roster, guilds, region):
+    """
+    Diffs a squadron against the other region's snapshot once for all its subscribed guilds.
+    Returns ([(squadron, embed, [(guild, channel preference)])] for the updates to send,
+    [guilds whose own pre-sharing snapshots were used and still need linking]).
+    """
+    opposite_region = "EU" if region == "US" else "US"
+    old_snapshot = await asyncio.to_thread(Alarms.load_squadron_snapshot, squadron_name, opposite_region)
+    migrated = []
+    if old_snapshot:
+        diffs = [(guilds, Alarms.diff_rosters(old_snapshot, roster))]
+    else:
+        # No squadron snapshot yet, diff against each guild's own copy from before they were shared
+        diffs = []
+        for guild, channel_value in guilds:
+            legacy_snapshot = await asyncio.to_thread(Alarms.load_snapshot, guild.id, squadron_name, opposite_region)
+            if legacy_snapshot:
+                diffs.append(([(guild, channel_value)], Alarms.diff_rosters(legacy_snapshot, roster)))
+                migrated.append(guild)
+
+    updates = []
+    for targets, diff in diffs:
+        if not diff.points_changes:
+            logging.info(f"(POINTS) No new points for {squadron_name}")
+            continue
+        # Built once and sent to every subscribed channel
+        updates.append((squadron_name, build_points_embed(squadron_name, region, diff), targets))
+    return updates, migrated
+
+
+async def record_points_history(roster):
+    # Once per squadron however many guilds track it
+    try:
+        await Points_History.record_roster(roster)
+    except Exception as e:
+        logging.error(f"(POINTS) Failed to record points history for {roster.squadron}: {e}")
 
-                # Save the new snapshot with the region specified
-                Alarms.save_snapshot(new_snapshot, guild_id, squadron_name,
-                                     region)
-                logging.info(f"(POINTS) New snapshot saved for {squadron_name} in region {region}")
+
+def save_squadron_points(squadron_name, roster, migrated, region):
+    # Save the new snapshot with the region specified, once for every guild tracking it
+    Alarms.save_squadron_snapshot(roster, squadron_name, region)
+    # Guilds subscribing now are linked by the alarm commands, only pre-sharing copies are left to replace
+    for guild in migrated:
+        Alarms.link_snapshot(guild.id, squadron_name, region)
+    logging.info(f"(POINTS) New snapshot saved for {squadron_name} in region {region}")
+
+
+async def execute_points_alarm_task(region):
+    """
+    Runs the points alarm as stages, each finished for every squadron before the next starts:
+    load all preferences, scrape each tracked squadron once, record history, diff, send, save snapshots.
+    Logs how long each stage took.
+    """
+    await cleanup_replays()
+    logging.info("Running points-update alarm")
+    run_start = stage_start = T.perf_counter()
+    stages = {}
+
+    def lap(stage):
+        nonlocal stage_start
+        now = T.perf_counter()
+        stages[stage] = now - stage_start
+        stage_start = now
+
+    # Preferences of every guild, grouped by squadron
+    guilds = list(bot.guilds)
+    all_preferences = await _bounded_gather(ALARM_IO_CONCURRENCY, [
+        (f"Loading preferences of guild {guild.id}", asyncio.to_thread(load_guild_preferences, guild.id))
+        for guild in guilds], default={})
+    tracked = {}  # every squadron in any guild's preferences, in first seen order
+    subscribers = {}  # squadron -> [(guild, Points channel preference)]
+    for guild, preferences in zip(guilds, all_preferences):
+        for squadron_name, squadron_preferences in preferences.items():
+            tracked[squadron_name] = None
+            if "Points" in squadron_preferences:
+                subscribers.setdefault(squadron_name, []).append((guild, squadron_preferences["Points"]))
+    lap("preferences")
+
+    # One scrape per squadron, ROSTER_CONCURRENCY at a time
+    rosters = await get_rosters(tracked)
+    fetched = {}
+    for squadron_name, roster in rosters.items():
+        if roster is None:
+            logging.error(f"(POINTS) Failed to fetch {squadron_name}, skipping")
+            continue
+        logging.info(f"{squadron_name} points at {roster.total_points}.")
+        fetched[squadron_name] = roster
+    lap("scrape")
+
+    await _bounded_gather(ALARM_IO_CONCURRENCY, [
+        (f"Recording history of {name}", record_points_history(roster)) for name, roster in fetched.items()])
+    lap("history")
+
+    alarmed = [name for name in fetched if name in subscribers]
+    results = await _bounded_gather(ALARM_IO_CONCURRENCY, [
+        (f"Diffing {name}", diff_squadron_points(name, fetched[name], subscribers[name], region)) for name in alarmed])
+    # A squadron whose diff failed keeps its old snapshot, so its changes are reported next run
+    diffed = {name: result for name, result in zip(alarmed, results) if result is not None}
+    updates = [update for squadron_updates, _ in diffed.values() for update in squadron_updates]
+    lap("diff")
+
+    sends = [(f"Sending {squadron_name} update to guild {guild.id}", send_points_update(guild, squadron_name, channel_value, embed))
+             for squadron_name, embed, targets in updates for guild, channel_value in targets]
+    await _bounded_gather(ALARM_SEND_CONCURRENCY, sends)
+    lap("send")
+
+    await _bounded_gather(ALARM_IO_CONCURRENCY, [
+        (f"Saving snapshot of {name}", asyncio.to_thread(save_squadron_points, name, fetched[name], migrated, region))
+        for name, (_, migrated) in diffed.items()])
+    lap("save")
+
+    summary = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in stages.items())
+    logging.info(f"(POINTS) {region} run finished in {T.perf_counter() - run_start:.1f}s ({summary}): "
+                 f"{len(guilds)} guilds, {len(tracked)} squadrons, {len(fetched)} scraped, {len(sends)} channel updates")
 
 
 @points_alarm_task.before_loop
@@ -501,6 +619,16 @@ async def auto_logging():
         logging.info(f"FINISHED PROCESSING {len(out)} REPLAYS")
 
         for game, guilds in hex_plus_guild.values():
+            # Render every language the subscribed guilds use in one pass before sending
+            try:
+                languages = set()
+                for guild, _ in guilds:
+                    guild_features = await load_features(guild.id)
+                    languages.add(guild_features.get("Language", "<English>"))
+                await ensure_scoreboards(game.get("sessionIdHex"), game.get("missionName"), game.get("endTime"), languages)
+            except Exception as e:
+                logging.error(f"Error rendering scoreboards for session {game.get('sessionIdHex')}: {e}")
+
             for guild, squadron_prefs in guilds:
                 try:
                     await process_session(bot, game.get("sessionIdHex"), guild.id, squadron_prefs, game.get("missionName"), guild.name, game.get("endTime"))
@@ -535,6 +663,83 @@ async def before_auto_logging_task():
     await bot.wait_until_ready()
 
 
+scoreboard_renders = {}  # (session_id, language) -> asyncio.Task currently rendering that scoreboard
+
+
+def scoreboard_path(session_id, language):
+    language = language.replace("<", "").replace(">", "")
+    return f"replays/0{session_id}/game_result-{language}.png"
+
+
+async def render_session_scoreboards(session_id, map_name, timestamp, languages):
+    with open(f"replays/0{session_id}/replay_data.json", "r") as replay_file:
+        replay_data = json.load(replay_file)
+
+    winner = replay_data.get("winning_team_squadron")
+    teams = replay_data.get("teams", [])
+
+    for team in teams:
+        for player in team.get("players", []):
+            if not player.get("vehicle"):
+                logging.warning(
+                    f"{player.get('nick')} did not have a vehicle, most likely a disconnect. REPLAY HEX 0{session_id}"
+                )
+                player["vehicle"] = "DISCONNECTED"
+
+    # Only the vehicle names change between languages, the rest of the board is drawn once
+    await load_languages(languages)
+    outputs = {}
+    for language in languages:
+        translate = LangTableReader(language)
+        outputs[scoreboard_path(session_id, language)] = {
+            player["vehicle"]: translate.get_translate(player["vehicle"] + "_shop")
+            for team in teams
+            for player in team.get("players", [])
+            if player["vehicle"] != "DISCONNECTED"
+        }
+
+    match_details = {
+        "utc_timestamp": str(timestamp),
+        "session_id": str(session_id)
+    }
+    await create_scoreboards(match_details, winner, teams[0], teams[1], map_name, outputs)
+
+
+async def ensure_scoreboards(session_id, map_name, timestamp, languages):
+    """
+    Makes sure the session's scoreboard exists in each language and returns {language: output_path}.
+    Callers asking for a (session, language) that is already being rendered await that render
+    instead of starting another, and all missing languages are rendered together.
+    """
+    paths = {language: scoreboard_path(session_id, language) for language in languages}
+
+    pending = set()
+    missing = []
+    for language, output_path in paths.items():
+        task = scoreboard_renders.get((session_id, language))
+        if task is not None:
+            pending.add(task)
+        elif not os.path.exists(output_path):
+            missing.append(language)
+
+    if missing:
+        keys = [(session_id, language) for language in missing]
+        task = asyncio.create_task(render_session_scoreboards(session_id, map_name, timestamp, missing))
+        for key in keys:
+            scoreboard_renders[key] = task
+
+        def forget_render(_):
+            for key in keys:
+                scoreboard_renders.pop(key, None)
+
+        task.add_done_callback(forget_render)
+        pending.add(task)
+
+    if pending:
+        await asyncio.gather(*pending)
+    return paths
+
+
 async def process_session(bot, session_id, guild_id, squadron_preferences, map_name, guild_name, timestamp):
     # Define the replay file path.
     replay_file_path = f"replays/0{session_id}/replay_data.json"
@@ -556,10 +761,8 @@ async def process_session(bot, session_id, guild_id, squadron_preferences, map_n
         logging.warning(f"Session {session_id} has a null 'winning_team_squadron'.")
         # return
 
-    # Retrieve the list of squadrons and teams from the replay.
+    # Retrieve the list of squadrons from the replay.
     squadrons = replay_data.get("squadrons", [])
-    teams = replay_data.get("teams", [])
-    mission = map_name  # Use the provided mission name.
     decimal_session_id = int(session_id, 16)
     replay_url = f"https://warthunder.com/en/tournament/replay/{decimal_session_id}"
 
@@ -607,31 +810,10 @@ async def process_session(bot, session_id, guild_id, squadron_preferences, map_n
 
     guild_features = await load_features(guild_id)
     language = guild_features.get("Language", "<English>")
-    translate = LangTableReader(language)
-
-    # Translate vehicles for each player in both teams in memory
-    for team in teams:
-        for player in team.get("players", []):
-            if player.get("vehicle"):
-                player["vehicle_new"] = translate.get_translate(player["vehicle"] + "_shop")
-            else:
-                logging.warning(
-                    f"{player.get('nick')} did not have a vehicle, most likely a disconnect. REPLAY HEX 0{session_id}"
-                )
-                player["vehicle"] = "DISCONNECTED"
-    
-    match_details = {
-        "utc_timestamp": str(timestamp),
-        "session_id": str(session_id)
-    }
-
-    language = language.replace("<","")
-    language = language.replace(">","")
-    
-    output_path = f"replays/0{session_id}/game_result-{language}.png"
 
-    if not os.path.exists(output_path):
-        await create_scoreboard(match_details, winner, teams[0], teams[1], mission, output_path)
+    # Usually already rendered by auto_logging for every language, otherwise this waits on (or starts) the render
+    output_path = (await ensure_scoreboards(session_id, map_name, timestamp, [language]))[language]
+    image_data, image_filename = await get_scoreboard_upload(output_path, guild_features.get("ScoreboardFormat"))
 
     
     # embed.set_image(url="attachment://game_result.png")
@@ -657,7 +839,7 @@ async def process_session(bot, session_id, guild_id, squadron_preferences, map_n
             view.add_item(button)
             
             # add a button under this image with a placeholder link and placeholder text
-            await channel.send(file=discord.File(output_path, filename="game_result.png"), view=view)
+            await channel.send(file=discord.File(io.BytesIO(image_data), filename=image_filename), view=view)
             
             logging.info(
                 f"Embed and image sent for session {session_id} in {guild_name} ({guild_id})"
@@ -809,8 +991,6 @@ async def find_comp(interaction: discord.Interaction, username: str):
                 squadrons = replay_data.get("squadrons", [])
                 #weather = replay_data.get("weather", "Unknown")
                 #time_of_day = replay_data.get("time_of_day", "Unknown")
-                winner = replay_data.get("winning_team_squadron")
-                teams = replay_data.get("teams", [])
 
                 decimal_session_id = int(session_id, 16)
                 replay_url = f"https://warthunder.com/en/tournament/replay/{decimal_session_id}"
@@ -828,44 +1008,19 @@ async def find_comp(interaction: discord.Interaction, username: str):
                 guild_features = await load_features(guild.id)
                 logging.info(guild_features)
                 language = guild_features.get("Language", "<English>")
-                translate = LangTableReader(language)
-
-
-                # Translate vehicles for each player in both teams in memory
-                for team in teams:
-                    for player in team.get("players", []):
-                        if player.get("vehicle"):
-                            player["vehicle_new"] = translate.get_translate(player["vehicle"] + "_shop")
-                        else:
-                            logging.warning(
-                                f"{player.get('nick')} did not have a vehicle, most likely a disconnect. REPLAY HEX 0{session_id}"
-                            )
-                            player["vehicle"] = "DISCONNECTED"
 
                 # Generate the scoreboard screenshot
-                output_path = f"replays/0{session_id}/game_result.png"
-
-                match_details = {
-                    "utc_timestamp": str(utc_timestamp),
-                    "session_id": str(session_id)
-                }
-
-                language = language.replace("<","")
-                language = language.replace(">","")
-
-                output_path = f"replays/0{session_id}/game_result-{language}.png"
-
-                if not os.path.exists(output_path):
-                    await create_scoreboard(match_details, winner, teams[0], teams[1], mission, output_path)
+                output_path = (await ensure_scoreboards(session_id, mission, utc_timestamp, [language]))[language]
+                image_data, image_filename = await get_scoreboard_upload(output_path, guild_features.get("ScoreboardFormat"))
 
                 # Attach the screenshot to the embed by setting it as the embed image.
-                # The filename ("game_result.png") must match the one in the file attachment.
-                embed.set_image(url="attachment://game_result.png")
+                # The filename (e.g. "game_result.png") must match the one in the file attachment.
+                embed.set_image(url=f"attachment://{image_filename}")
                 
                 try:
                     # Send the embed along with the screenshot file attached.
                     await interaction.followup.send(
-                        embed=embed,file=discord.File(output_path, filename="game_result.png")
+                        embed=embed,file=discord.File(io.BytesIO(image_data), filename=image_filename)
                     )
 
                     try:
@@ -947,6 +1102,8 @@ async def alarm(
 
     # save and confirm
     client.upload_from_text(key, json.dumps(preferences))
+    if alarm_type == "Points":
+        Alarms.link_snapshots(guild_id, long_name)
     await interaction.followup.send(f"{alarm_type} alarm for {squadron_name} set to channel {channel_id}.", ephemeral=True)
 
     logging.info(f"{guild_name} ({guild_id}) is now logging {squadron_name} in channel ID {channel_id}")
@@ -1004,6 +1161,8 @@ async def quick_log(interaction: discord.Interaction, sq_name: str, type: str =
 
     # save it back
     client.upload_from_text(key, json.dumps(preferences))
+    if type == "Points":
+        Alarms.link_snapshots(guild_id, long_name)
 
     await interaction.followup.send(
         f"{type} alarm for {sq_name} set to this channel.",
@@ -1198,52 +1357,51 @@ async def set_squadron(interaction: Interaction, abbreviated_name: str):
     await interaction.followup.send(embed=embed, ephemeral=False)
 
 
-@bot.tree.command(name='top', description='Get the top 20 squadrons with detailed stats')
-async def top(interaction: discord.Interaction):
-    await interaction.response.defer()
+# The /top embed for the last page get_top_20() returned, rebuilt only when that page changes
+_top_embed = (None, None)
 
-    squadron_data = await get_top_20()
-    if not squadron_data:
-        await interaction.followup.send("Failed to retrieve squadron data.", ephemeral=True)
-        return
 
+def build_top_embed(squadron_data):
     embed = discord.Embed(title="**Top 20 Squadrons**", color=discord.Color.purple())
 
     for idx, squadron in enumerate(squadron_data, start=1):
-        ground_kills = squadron.get("g_kills", 0)
-        air_kills = squadron.get("a_kills", 0)
-        total_kills = ground_kills + air_kills
-        deaths = squadron.get("deaths", 1)  # Avoid division by zero
-        kd_ratio = round(total_kills / deaths, 2) if deaths else "N/A"
-
-        # Calculate win rate (ensure battles is not zero to avoid division errors)
-        wins = squadron.get("wins", 0)
-        battles = squadron.get("battles", 0)
-        win_rate = round((wins / battles) * 100, 2) if battles else "N/A"
-
-        playtime_minutes = squadron.get("playtime", 0)
-        days = playtime_minutes // 1440
-        hours = (playtime_minutes % 1440) // 60
-        minutes = playtime_minutes % 60
-        formatted_playtime = f"{days}d {hours}h {minutes}m"
+        stats = clan_stats(squadron)
+        kd_ratio = round(stats["kd_ratio"], 2) if stats["kd_ratio"] is not None else "N/A"
+        win_rate = f"{round(stats['win_rate'], 2)}%" if stats["win_rate"] is not None else "N/A"
 
         embed.add_field(
             name=f"**{idx} - {squadron['tag']}**",
             value=(
                 f"**Squadron Score:** {squadron.get('clanrating', 'N/A')}\n"
-                f"**Air Kills:** {air_kills}\n"
-                f"**Ground Kills:** {ground_kills}\n"
-                f"**Deaths:** {deaths}\n"
+                f"**Air Kills:** {squadron.get('a_kills', 0)}\n"
+                f"**Ground Kills:** {squadron.get('g_kills', 0)}\n"
+                f"**Deaths:** {squadron.get('deaths', 0)}\n"
                 f"**K/D:** {kd_ratio}\n"
-                f"**Win Rate:** {win_rate if win_rate == 'N/A' else str(win_rate) + '%'}\n"
-                f"**Playtime:** {formatted_playtime}\n"
+                f"**Win Rate:** {win_rate}\n"
+                f"**Playtime:** {stats['playtime']}\n"
                 "\u200b"  # Adds spacing
             ),
             inline=True  # Each squadron appears on a new line
         )
 
     embed.set_footer(text="Meow :3")
-    await interaction.followup.send(embed=embed, ephemeral=False)
+    return embed
+
+
+@bot.tree.command(name='top', description='Get the top 20 squadrons with detailed stats')
+async def top(interaction: discord.Interaction):
+    global _top_embed
+    await interaction.response.defer()
+
+    squadron_data = await get_top_20()
+    if not squadron_data:
+        await interaction.followup.send("Failed to retrieve squadron data.", ephemeral=True)
+        return
+
+    # get_top_20() hands back the same list until it refetches, so the embed can be reused until then
+    if _top_embed[0] is not squadron_data:
+        _top_embed = (squadron_data, build_top_embed(squadron_data))
+    await interaction.followup.send(embed=_top_embed[1], ephemeral=False)
 
 
 async def load_features(guild_id):
@@ -1354,6 +1512,56 @@ async def languages_error(interaction: discord.Interaction, error):
     if isinstance(error, app_commands.CheckFailure):
         await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
 
+class ScoreboardFormatSelect(discord.ui.Select):
+    def __init__(self):
+        # Shown label -> SCOREBOARD_FORMATS key stored in the guild's features
+        self.format_mapping = {
+            "PNG (largest, lossless)": "png",
+            "PNG 256 colours (smaller)": "png8",
+            "WebP (smallest)": "webp",
+            "JPEG (small, lossy)": "jpeg",
+        }
+
+        options = [
+            discord.SelectOption(label=label, value=value)
+            for label, value in self.format_mapping.items()
+            if value in SCOREBOARD_FORMATS
+        ]
+
+        super().__init__(
+            placeholder="Choose the scoreboard image format",
+            min_values=1,
+            max_values=1,
+            options=options
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        guild_id = interaction.guild.id
+        guild_name = interaction.guild.name
+        features = await load_features(guild_id)
+
+        features["ScoreboardFormat"] = self.values[0]
+        await save_features(guild_id, features)
+
+        await interaction.response.send_message(f"Scoreboards will be sent as {self.values[0]}.", ephemeral=True)
+        logging.info(f"Guild {guild_name} ({guild_id}) set their scoreboard format to {self.values[0]}")
+
+class ScoreboardFormatView(discord.ui.View):
+    def __init__(self):
+        super().__init__()
+        self.add_item(ScoreboardFormatSelect())
+
+@bot.tree.command(name="scoreboard-format", description="Change the image format of the game log scoreboards.")
+@app_commands.check(is_admin)
+async def scoreboard_format(interaction: discord.Interaction):
+    view = ScoreboardFormatView()
+    await interaction.response.send_message("Please select the scoreboard format:", view=view, ephemeral=True)
+
+@scoreboard_format.error
+async def scoreboard_format_error(interaction: discord.Interaction, error):
+    if isinstance(error, app_commands.CheckFailure):
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+
 
 
 # Dictionary mapping flag emojis to uppercase, allowed language codes
@@ -1498,13 +1706,12 @@ async def track_squadron(interaction: discord.Interaction,
     wins = int(clan_data.get("wins"))
     members = clan_data.get("members")
 
-    total_kills = ground_kills + air_kills
-    kd_ratio = total_kills / deaths if deaths > 0 else total_kills
+    stats = clan_stats(clan_data)
+    total_kills = stats["total_kills"]
+    losses = stats["losses"]
+    kd_ratio = stats["kd_ratio"] if stats["kd_ratio"] is not None else total_kills
     kd_ratio_percentage = f"{kd_ratio:.2f}"
-
-    losses = battles - wins
-    win_rate = (wins / battles) * 100 if battles > 0 else 0
-    win_rate_percentage = f"{win_rate:.2f}%"
+    win_rate_percentage = f"{stats['win_rate'] or 0:.2f}%"
 
     embed = discord.Embed(title=f"**{clan_tag}**", color=discord.Color.green())
 
@@ -1995,7 +2202,8 @@ async def help(interaction: discord.Interaction):
         "11. **/donate** - Get a link to donate to the bot, its appreciated!\n"
         "12. **/notifications** - Manage your alarms for the server.\n"
         "13. **/languages** - Change the default language of the bot, for now this will just change the language of the vehicles in your logs.\n"
-        "14. **Translation** - Put a flag reaction under a message to translate to that language (after using /toggle).\n\n"
+        "14. **/scoreboard-format** - Change the image format of the game log scoreboards, WebP or PNG 256 colours are the smallest.\n"
+        "15. **Translation** - Put a flag reaction under a message to translate to that language (after using /toggle).\n\n"
         "*For detailed information on each command, please read the input descriptions of each command, or reach out to not_so_toothless.*"
     )
 
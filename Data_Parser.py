@@ -1,12 +1,19 @@
 import asyncio
 import csv
+import hashlib
 import io
+import json
 import logging
 import re
 import string
+import threading
+from array import array
+from collections import namedtuple
+from enum import Enum
 from io import StringIO
 
 import aiofiles
+import zstandard
 
 from src_send.WtFileUtils.vromfs.VROMFs import VROMFs
 
@@ -15,73 +22,234 @@ from src_send.WtFileUtils.vromfs.VROMFs import VROMFs
 import os
 
 
-v = VROMFs("char.vromfs.bin").get_directory()
-f1 = v["config"]["unittags.blk"].get_data()["root"]
+class UnitClass(Enum):
+    SPAA = "SPAA"
+    LIGHT_TANK = "Light Tank"
+    TANK = "Tank"
+    FIGHTER = "Fighter"
+    BOMBER = "Bomber"
+    HELICOPTER = "Helicopter"
+    UNKNOWN = "Unknown"
+
+
+UnitInfo = namedtuple("UnitInfo", ["unit_class", "abbreviation", "display_class"])
+
+# unittags.blk tag -> what it classifies a unit as, the first matching tag of a unit wins
+TAG_CLASSES = {
+    "type_spaa": UnitInfo(UnitClass.SPAA, "AA", "SPAA"),
+    "type_light_tank": UnitInfo(UnitClass.LIGHT_TANK, "L", "Light Tank"),
+    "type_heavy_tank": UnitInfo(UnitClass.TANK, "T", "Tank"),
+    "type_medium_tank": UnitInfo(UnitClass.TANK, "T", "Tank"),
+    "type_fighter": UnitInfo(UnitClass.FIGHTER, "F", "Fighter"),
+    "type_bomber": UnitInfo(UnitClass.BOMBER, "B", "Bomber"),
+    "type_helicopter": UnitInfo(UnitClass.HELICOPTER, "H", "Helicopter"),
+}
+
+# Used for units missing from unittags.blk (e.g. "DISCONNECTED") or without a known type tag
+UNKNOWN_UNIT = UnitInfo(UnitClass.UNKNOWN, "?", "Unknown")
+CLASS_INFO = {info.unit_class: info for info in [*TAG_CLASSES.values(), UNKNOWN_UNIT]}
+
+# Parsed game files are cached here, bump the version whenever the cached layout changes
+INDEX_CACHE_DIR = "CACHE"
+INDEX_CACHE_VERSION = 2
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _read_index_cache(name, digest):
+    """Returns the data cached under name if it was built from a source file with this digest, else None."""
+    path = os.path.join(INDEX_CACHE_DIR, f"{name}.json.zst")
+    try:
+        with open(path, "rb") as f:
+            payload = json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable index cache {path}: {e}")
+        return None
+
+    if payload.get("version") != INDEX_CACHE_VERSION or payload.get("source") != digest:
+        return None
+    return payload["data"]
+
+
+def _write_index_cache(name, digest, data):
+    os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+    path = os.path.join(INDEX_CACHE_DIR, f"{name}.json.zst")
+    payload = json.dumps({"version": INDEX_CACHE_VERSION, "source": digest, "data": data}, ensure_ascii=False)
+    try:
+        with open(path + ".tmp", "wb") as f:
+            f.write(zstandard.ZstdCompressor(level=10).compress(payload.encode("utf-8")))
+        os.replace(path + ".tmp", path)  # never leave a half written cache behind
+    except OSError as e:
+        logging.warning(f"Could not write index cache {path}: {e}")
+
+
+def build_unit_index(unit_tags):
+    """Classifies every unit in the parsed unittags.blk root once, internal name -> UnitInfo."""
+    index = {}
+    for internal_name, internal_data in unit_tags.items():
+        tags = list((internal_data.get("tags") or {}).keys())
+        if internal_data.get("type", None) == "helicopter":
+            tags += ["type_helicopter"]
+
+        info = UNKNOWN_UNIT
+        for key in tags:
+            if key in TAG_CLASSES:
+                info = TAG_CLASSES[key]
+                break
+        index[internal_name] = info
+    return index
+
+
+def load_unit_index(vromfs_path="char.vromfs.bin"):
+    """Unit index for the given char.vromfs.bin, from the on-disk cache unless the game files changed."""
+    digest = _file_digest(vromfs_path)
+    cached = _read_index_cache("unit_index", digest)
+    if cached is not None:
+        return {name: CLASS_INFO[UnitClass[class_name]] for name, class_name in cached.items()}
+
+    v = VROMFs(vromfs_path).get_directory()
+    f1 = v["config"]["unittags.blk"].get_data()["root"]
+    index = build_unit_index(f1)
+    _write_index_cache("unit_index", digest, {name: info.unit_class.name for name, info in index.items()})
+    logging.info(f"Indexed {len(index)} units from unittags.blk")
+    return index
+
+
+class LangTable:
+    """
+    units.csv, loaded one language column at a time on first use. A loaded language is one string
+    holding all of its values plus an array of offsets into it, indexed by row number through a
+    shared key -> row dict, so memory grows with the languages in use rather than with the file.
+    Loading a column can mean parsing the whole vromfs, so code on the event loop should go
+    through load_languages() first.
+    """
+
+    def __init__(self, vromfs_path="lang.vromfs.bin"):
+        self.vromfs_path = vromfs_path
+        self._digest = None
+        self._header = None
+        self._rows = None  # key -> row number
+        self._columns = {}  # language index -> (text, offsets)
+        self._lock = threading.Lock()  # loads happen in worker threads, only one at a time
+
+    def _source_digest(self):
+        if self._digest is None:
+            self._digest = _file_digest(self.vromfs_path)
+        return self._digest
+
+    def _parse(self):
+        """Parses units.csv from the vromfs, caches every column on disk and returns them all."""
+        lang_dir = VROMFs(self.vromfs_path).get_directory()
+        file = lang_dir["lang"]["units.csv"]
+        z = csv.reader(StringIO(file.get_data().decode('utf-8')), delimiter=';')
+        header = z.__next__()[1:]
+
+        keys = []
+        values = [[] for _ in header]
+        for line in z:
+            keys.append(line[0])
+            for i, column in enumerate(values):
+                column.append(line[i + 1].replace("\\t", "\t") if i + 1 < len(line) else "")
+
+        columns = []
+        for column in values:
+            offsets = [0]
+            for value in column:
+                offsets.append(offsets[-1] + len(value))
+            columns.append(("".join(column), offsets))
+
+        digest = self._source_digest()
+        _write_index_cache("lang_index", digest, {"header": header, "keys": keys})
+        for i, (text, offsets) in enumerate(columns):
+            _write_index_cache(f"lang_column_{i}", digest, {"text": text, "offsets": offsets})
+        logging.info(f"Parsed {len(keys)} rows in {len(header)} languages from units.csv")
+
+        # Rows first, a set header is what tells other threads the index is ready
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._header = header
+        return columns
+
+    def _load_index(self):
+        with self._lock:
+            if self._header is not None:
+                return
+            cached = _read_index_cache("lang_index", self._source_digest())
+            if cached is None:
+                self._parse()
+                return
+            self._rows = {key: row for row, key in enumerate(cached["keys"])}
+            self._header = cached["header"]
+
+    def languages(self):
+        if self._header is None:
+            self._load_index()
+        return self._header
+
+    def column(self, index):
+        if index not in self._columns:
+            languages = self.languages()
+            with self._lock:
+                if index not in self._columns:
+                    cached = _read_index_cache(f"lang_column_{index}", self._source_digest())
+                    if cached is not None:
+                        text, offsets = cached["text"], cached["offsets"]
+                    else:
+                        text, offsets = self._parse()[index]
+                    self._columns[index] = (text, array("I", offsets))
+                    logging.info(f"Loaded {languages[index]} column of units.csv")
+        return self._columns[index]
+
+    def load(self, languages=()):
+        """Loads the index and the columns of the given languages, so later lookups don't touch the disk."""
+        header = self.languages()
+        for language in languages:
+            if language in header:
+                self.column(header.index(language))
+
+    def get(self, index, key):
+        if self._rows is None:
+            self._load_index()
+        row = self._rows[key]
+        text, offsets = self.column(index)
+        return text[offsets[row]:offsets[row + 1]]
+
+
+lang_table = LangTable()
+
+
+async def load_languages(languages=()):
+    """lang_table.load() in a worker thread, for callers on the event loop."""
+    await asyncio.to_thread(lang_table.load, languages)
+
+
+unit_index = load_unit_index()
+
+
+def get_unit(internal_name):
+    return unit_index.get(internal_name, UNKNOWN_UNIT)
+
+
 def get_unit_info(internal_name):
-    internal_data = f1[internal_name]
-    tags = list(internal_data["tags"].keys())
-    if internal_data.get("type", None) == "helicopter":
-        tags += ["type_helicopter"]
-    for key in tags:
-        match key:
-            case "type_spaa":
-                return "SPAA"
-            case "type_light_tank":
-                return "Light Tank"
-            case "type_heavy_tank":
-                return "Tank"
-            case "type_medium_tank":
-                return "Tank"
-            case "type_fighter":
-                return "Fighter"
-            case "type_bomber":
-                return "Bomber"
-            case "type_helicopter":
-                return "Helicopter"
-    print(f"ERROR DETERMING VEHICLE TYPE FOR UNIT: {internal_name} WITH TAGS: {tags}")
+    return get_unit(internal_name).display_class
+
 
 def get_unit_info_abrev(internal_name):
-    internal_data = f1[internal_name]
-    tags = list(internal_data["tags"].keys())
-    if internal_data.get("type", None) == "helicopter":
-        tags += ["type_helicopter"]
-    for key in tags:
-        match key:
-            case "type_spaa":
-                return "AA"
-            case "type_light_tank":
-                return "L"
-            case "type_heavy_tank":
-                return "T"
-            case "type_medium_tank":
-                return "T"
-            case "type_fighter":
-                return "F"
-            case "type_bomber":
-                return "B"
-            case "type_helicopter":
-                return "H"
-    print(f"ERROR DETERMING VEHICLE TYPE FOR UNIT: {internal_name} WITH TAGS: {tags}")
+    return get_unit(internal_name).abbreviation
+
 
 def get_dict_from_list(internal_name_list):
     payload = {}
     for name in internal_name_list:
-        t = get_unit_info_abrev(name)
-        if t in payload:
-            payload[t] += 1
-        else:
-            payload[t] = 1
+        t = unit_index.get(name, UNKNOWN_UNIT).abbreviation
+        payload[t] = payload.get(t, 0) + 1
     return payload
 
 class LangTableReader:
-    lang_dir = VROMFs("lang.vromfs.bin").get_directory() 
-    file = lang_dir["lang"]["units.csv"]
-    z = csv.reader(StringIO(file.get_data().decode('utf-8')), delimiter=';')
-    global_data = {}
-    header_info = z.__next__()[1:]
-    for line in z:
-        global_data.update({line[0]: line[1:]})
-        
     def __init__(self, language):
         self.index = 0 # defaults to english
         self.update_langauge(language)
@@ -89,16 +257,15 @@ class LangTableReader:
 
 
     def update_langauge(self, lang):
-        if lang in self.header_info:
-            self.index = self.header_info.index(lang)
+        languages = lang_table.languages()
+        if lang in languages:
+            self.index = languages.index(lang)
             return True
         return False
 
     def get_translate(self, value):
-        #logging.info(f"translating value {value} into {LangTableReader.header_info[self.index]}")
-        val = LangTableReader.global_data[value][self.index]
-        val = val.replace("\\t", "\t")
-        return val
+        #logging.info(f"translating value {value} into {lang_table.languages()[self.index]}")
+        return lang_table.get(self.index, value)
         
 # with open("temp.txt", "w") as f:
 #     for x, y in internal_to_name.items():
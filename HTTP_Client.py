@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+# One pooled session for every warthunder.com request, so connections, TLS sessions and DNS answers are reused
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 30))  # seconds, per request
+HTTP_CONNECTIONS = int(os.environ.get("HTTP_CONNECTIONS", 32))
+HTTP_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_CONNECTIONS_PER_HOST", 16))
+DNS_CACHE_TTL = 5 * 60
+KEEPALIVE_TIMEOUT = 60
+# Token bucket shared by all requests: HTTP_RATE requests per second on average, bursts of up to HTTP_BURST
+HTTP_RATE = float(os.environ.get("HTTP_RATE", 20))
+HTTP_BURST = int(os.environ.get("HTTP_BURST", 20))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a token is available and takes it. Waiters are served in order."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_session = None
+_session_loop = None
+_limiter = TokenBucket(HTTP_RATE, HTTP_BURST)
+
+
+def get_session():
+    """Returns the shared ClientSession, opening it on first use (or if the event loop changed)."""
+    global _session, _session_loop, _limiter
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_CONNECTIONS,
+            limit_per_host=HTTP_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        )
+        if _session_loop is not loop:
+            # asyncio locks belong to one loop
+            _limiter = TokenBucket(HTTP_RATE, HTTP_BURST)
+        _session_loop = loop
+    return _session
+
+
+@asynccontextmanager
+async def get(url, **kwargs):
+    """Rate limited GET over the shared session, used like session.get():
+
+        async with HTTP_Client.get(url) as response:
+            text = await response.text()
+    """
+    session = get_session()
+    await _limiter.acquire()
+    async with session.get(url, **kwargs) as response:
+        yield response
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -1,27 +1,97 @@
 import asyncio
 import json
 import logging
+import os
+import time
+from functools import partial
 
 import aiohttp
+import zstandard
+from replit.object_storage import Client
+from replit.object_storage.errors import ObjectNotFoundError
+
+import HTTP_Client
 
 logging.basicConfig(level=logging.INFO)
 
+client = Client()
+
+MAX_PAGES = 1000
+# Leaderboard pages fetched at once during a crawl
+CRAWL_CONCURRENCY = int(os.environ.get("LEADERBOARD_CONCURRENCY", 8))
+# The crawl stops once this many pages in a row come back empty, i.e. we walked off the end of the leaderboard
+EMPTY_PAGES_TO_STOP = 3
+FETCH_RETRIES = 3
+RETRY_BACKOFF = 1.0  # seconds, doubled on each retry
+
+# Background refresh, see refresh_loop()
+REFRESH_INTERVAL = 60  # seconds between refresher passes
+REFRESH_PAGES_PER_PASS = 50
+# A lookup miss re-fetches up to this many pages older than MISS_REFRESH_AGE seconds,
+# and waits at most MISS_WAIT seconds for them before answering from what it has.
+MISS_REFRESH_PAGES = 25
+MISS_REFRESH_AGE = 10 * 60
+MISS_WAIT = 15
+
+# The cache is saved to object storage so a restart can serve lookups before the first crawl finishes
+SNAPSHOT_KEY = "LEADERBOARD/snapshot.json.zst"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_INTERVAL = 15 * 60
+
+# /top is served from a copy of page 1 at most this old
+TOP_TTL = 60
+
 cache = None
+page_times = []  # when each page of cache was fetched, same order as cache
+# Secondary indexes over cache, rebuilt by set_cache(): field -> casefolded value -> clan
+clan_index = {"short_name": {}, "tag": {}, "long_name": {}}
+
+_cache_ready = asyncio.Event()
+_refresher_task = None
+_refresh_task = None  # the crawl/refresh currently in flight, only one runs at a time
+_miss_task = None  # the pending retry pass for names that missed the cache
+_missed_names = set()  # (field, casefolded name) waiting on _miss_task
+_last_snapshot = 0
+_top_page = (0, None)  # (fetched_at, clans) of the last page 1 fetched for get_top_20()
+_top_task = None
+
+
+def page_ttl(page):
+    """How long a leaderboard page stays fresh, the top pages move fastest."""
+    if page <= 5:
+        return 5 * 60
+    if page <= 50:
+        return 30 * 60
+    return 3 * 60 * 60
 
 async def fetch_clan_leaderboard(page=1):
+    """Fetches and parses one leaderboard page, retrying with backoff. Returns None if the page couldn't be fetched."""
     url = f"https://warthunder.com/en/community/getclansleaderboard/dif/_hist/page/{page}/sort/dr_era5"
-    async with aiohttp.ClientSession() as session, session.get(url) as response:
-        if response.status == 200:
-            text = await response.text()  
-            try:
-                data = json.loads(text)  
-                return parse_clan_data(data)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                return None
-        else:
-            #print(f"Failed to fetch page {page}: HTTP {response.status}")
-            return None
+    for attempt in range(FETCH_RETRIES):
+        try:
+            async with HTTP_Client.get(url) as response:
+                if response.status == 200:
+                    text = await response.text()  
+                    try:
+                        data = json.loads(text)  
+                    except json.JSONDecodeError as e:
+                        print(f"JSON parsing error: {e}")
+                        return None
+                    if data.get("status") == "ok":
+                        return parse_clan_data(data)
+                    # An error status says nothing about where the leaderboard ends, retry it like a 5xx
+                    logging.warning(f"Leaderboard page {page} returned status {data.get('status')}")
+                # Other client errors won't get better by retrying
+                elif response.status != 429 and response.status < 500:
+                    return None
+                else:
+                    logging.warning(f"Leaderboard page {page} returned HTTP {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Error fetching leaderboard page {page}: {e}")
+
+        if attempt < FETCH_RETRIES - 1:
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+    return None
 
 def parse_clan_data(data):
     if data.get("status") != "ok":
@@ -42,56 +112,348 @@ def parse_clan_data(data):
             "deaths": entry.get("astat", {}).get("deaths_hist"),
             "playtime": entry.get("astat", {}).get("ftime_hist"),
             "clanrating": entry.get("astat", {}).get("dr_era5_hist"),
+            "fetched_at": time.time(),
         }
         clans.append(clan_info)
 
     return clans
 
+def clan_stats(clan):
+    """Derived stats shared by /top and /track, worked out once per clan entry and kept on it."""
+    stats = clan.get("stats")
+    if stats is None:
+        ground_kills = clan.get("g_kills") or 0
+        air_kills = clan.get("a_kills") or 0
+        deaths = clan.get("deaths") or 0
+        wins = clan.get("wins") or 0
+        battles = clan.get("battles") or 0
+        playtime_minutes = clan.get("playtime") or 0
+
+        stats = {
+            "total_kills": ground_kills + air_kills,
+            "kd_ratio": (ground_kills + air_kills) / deaths if deaths else None,
+            "losses": battles - wins,
+            "win_rate": wins / battles * 100 if battles else None,
+            "playtime": f"{playtime_minutes // 1440}d {(playtime_minutes % 1440) // 60}h {playtime_minutes % 60}m",
+        }
+        clan["stats"] = stats
+    return stats
+
+
+async def _fetch_top_page():
+    global _top_page
+    clans = await fetch_clan_leaderboard()
+    if clans:
+        for clan in clans:
+            clan_stats(clan)
+        _top_page = (time.time(), clans)
+    return clans
+
+
 async def get_top_20():
-    clan_data = await fetch_clan_leaderboard()
+    """
+    Page 1 of the leaderboard with clan_stats() filled in, at most TOP_TTL seconds old.
+    Served from the refresher's cache or the last fetch when fresh enough, and concurrent
+    callers share a single fetch otherwise. The same list is returned until it goes stale.
+    """
+    global _top_task
+    now = time.time()
+    fetched_at, clans = _top_page
+    if cache and cache[0] and page_times[0] > fetched_at and now - page_times[0] < TOP_TTL:
+        fetched_at, clans = page_times[0], cache[0]
+        for clan in clans:
+            clan_stats(clan)
+    if clans and now - fetched_at < TOP_TTL:
+        return clans
+
+    if _top_task is None or _top_task.done():
+        _top_task = asyncio.create_task(_fetch_top_page())
+    clan_data = await asyncio.shield(_top_task)
     if clan_data:
         return clan_data
-        
+    # Better a slightly old top 20 than none
+    return clans
+
+
+def build_clan_index(pages):
+    index = {field: {} for field in clan_index}
+    for clan_data in pages:
+        if clan_data:
+            for clan in clan_data:
+                for field, lookup in index.items():
+                    value = clan.get(field)
+                    # Keep the best ranked clan if two share a name
+                    if value and value.casefold() not in lookup:
+                        lookup[value.casefold()] = clan
+    return index
+
+
+def set_cache(pages, times=None):
+    """Swaps in new leaderboard pages (with when each was fetched, default now) and their lookup indexes."""
+    global cache, clan_index, page_times
+    if times is None:
+        # Pages that failed to fetch count as never fetched so the refresher retries them first
+        now = time.time()
+        times = [now if page is not None else 0 for page in pages]
+    clan_index = build_clan_index(pages)
+    page_times = times
+    cache = pages
+    _cache_ready.set()
+
+
+def clan_age(clan):
+    """Seconds since this clan's leaderboard entry was fetched."""
+    return time.time() - clan.get("fetched_at", 0)
+
+
+def stale_pages(max_age=None, limit=None):
+    """Cached page numbers older than their page_ttl (or max_age), most overdue first."""
+    now = time.time()
+    overdue = []
+    for page, fetched_at in enumerate(page_times, start=1):
+        ttl = max_age if max_age is not None else page_ttl(page)
+        age = now - fetched_at
+        if age > ttl:
+            overdue.append((age / ttl, page))
+    overdue.sort(reverse=True)
+    pages = [page for _, page in overdue]
+    return pages[:limit] if limit else pages
+
+
+async def refresh_pages(pages, concurrency=CRAWL_CONCURRENCY):
+    """Re-fetches the given page numbers and swaps them into the cache, pages that fail or come back empty
+    before the end of the leaderboard keep their old data."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(page):
+        async with semaphore:
+            return page, await fetch_clan_leaderboard(page)
+
+    results = await asyncio.gather(*[fetch(page) for page in pages])
+
+    # Patch a copy and swap it in, so lookups never see a half refreshed cache
+    new_pages = list(cache or [])
+    new_times = list(page_times)
+    now = time.time()
+    for page, clans in sorted(results):
+        # Failed and empty pages keep their old data and age, so they stay stale and are retried
+        if not clans:
+            continue
+        while len(new_pages) < page:
+            new_pages.append(None)
+            new_times.append(0)  # never fetched, so stale straight away
+        new_pages[page - 1] = clans
+        new_times[page - 1] = now
+
+    # The leaderboard shrank, an empty page only counts once every page after it is empty too
+    empty_pages = {page for page, clans in results if clans == []}
+    while new_pages and (new_pages[-1] == [] or len(new_pages) in empty_pages):
+        new_pages.pop()
+        new_times.pop()
+    set_cache(new_pages, new_times)
+    logging.info(f"Refreshed {len(pages)} leaderboard pages")
+
 
-async def search_for_clan(short_name, second_iter=False):
-    global cache
-    """Search for a clan by short_name across up to 1000 pages concurrently.
-    Caches data to prevent multiple calls to the API. If the clan is not found on the first iteration, it will refresh the cache and try again.
-    If it is not found in the second iteration, it will return None.
+def single_flight_refresh(make_refresh):
+    """Starts make_refresh() unless a refresh is already in flight, and returns the one in flight either way."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(make_refresh())
+    return _refresh_task
+
+
+async def _crawl_all():
+    set_cache(await get_all_clans())
+
+
+def _write_snapshot(pages, times):
+    payload = json.dumps({"version": SNAPSHOT_VERSION, "saved_at": time.time(), "pages": pages, "page_times": times},
+                         separators=(",", ":"))
+    client.upload_from_bytes(SNAPSHOT_KEY, zstandard.ZstdCompressor(level=10).compress(payload.encode("utf-8")))
+
+
+async def save_leaderboard_snapshot():
+    global _last_snapshot
+    if cache is None:
+        return
+    await asyncio.to_thread(_write_snapshot, cache, page_times)
+    _last_snapshot = time.time()
+    logging.info(f"Saved leaderboard snapshot with {len(cache)} pages")
+
+
+def _read_snapshot():
+    data = client.download_as_bytes(SNAPSHOT_KEY)
+    return json.loads(zstandard.ZstdDecompressor().decompress(data))
+
+
+async def load_leaderboard_snapshot():
+    """Fills an empty cache from the last saved snapshot, keeping its page ages so the refresher revalidates it.
+    Returns True if a snapshot was loaded."""
+    global _last_snapshot
+    try:
+        payload = await asyncio.to_thread(_read_snapshot)
+    except ObjectNotFoundError:
+        logging.info("No leaderboard snapshot saved yet")
+        return False
+    except Exception as e:
+        logging.error(f"Error loading leaderboard snapshot: {e}")
+        return False
+
+    if payload.get("version") != SNAPSHOT_VERSION:
+        logging.warning(f"Ignoring leaderboard snapshot version {payload.get('version')}")
+        return False
+
+    if cache is None:
+        set_cache(payload["pages"], payload["page_times"])
+        _last_snapshot = payload["saved_at"]
+        logging.info(f"Loaded leaderboard snapshot of {len(cache)} pages, {(time.time() - payload['saved_at']) / 60:.0f} minutes old")
+    return True
+
+
+async def refresh_loop():
+    """Keeps the cache fresh: one full crawl to start, then only the pages past their TTL on every pass."""
+    while True:
+        try:
+            if cache is None:
+                await single_flight_refresh(_crawl_all)
+            else:
+                # Also look one page past the end in case the leaderboard grew
+                pages = stale_pages(limit=REFRESH_PAGES_PER_PASS) + [len(cache) + 1]
+                await single_flight_refresh(partial(refresh_pages, pages))
+
+            if time.time() - _last_snapshot > SNAPSHOT_INTERVAL:
+                await save_leaderboard_snapshot()
+        except Exception as e:
+            logging.error(f"Error refreshing leaderboard cache: {e}")
+        await asyncio.sleep(REFRESH_INTERVAL)
+
+
+def start_refresher():
+    global _refresher_task
+    if _refresher_task is None or _refresher_task.done():
+        _refresher_task = asyncio.create_task(refresh_loop())
+    return _refresher_task
+
+
+async def _wait_at_most(awaitable, timeout):
+    """Waits for awaitable up to timeout seconds, it keeps running in the background afterwards."""
+    try:
+        await asyncio.wait_for(asyncio.shield(awaitable), timeout)
+    except asyncio.TimeoutError:
+        logging.warning(f"Leaderboard refresh still running after {timeout} seconds, answering from the cache")
+
+
+async def _retry_missed_names():
+    """One refresh for every name that missed since the last pass, then a single lookup pass over all of them."""
+    if _refresh_task is not None and not _refresh_task.done():
+        # Something is already fetching, let it land before deciding what is still stale
+        await asyncio.wait([_refresh_task])
+
+    pages = stale_pages(max_age=MISS_REFRESH_AGE, limit=MISS_REFRESH_PAGES)
+    if pages:
+        await single_flight_refresh(partial(refresh_pages, pages))
+
+    names = set(_missed_names)
+    _missed_names.difference_update(names)
+    found = {(field, name): find_clan(name, field) for field, name in names}
+    logging.info(f"Retried {len(names)} missed clans after one refresh, found {sum(1 for clan in found.values() if clan)}")
+    return found
+
+
+async def _lookup_after_refresh(name, field):
+    global _miss_task
+    key = (field, name.casefold())
+    _missed_names.add(key)
+    if _miss_task is None or _miss_task.done():
+        _miss_task = asyncio.create_task(_retry_missed_names())
+    task = _miss_task
+
+    await _wait_at_most(task, MISS_WAIT)
+    if task.done() and not task.cancelled() and task.exception() is None and key in task.result():
+        return task.result()[key]
+    # Joined after the pass took its names, timed out or the refresh failed: use whatever is cached now
+    return find_clan(name, field)
+
+
+def find_clan(name, field="short_name"):
+    """Looks a clan up in the cache by short_name, tag or long_name (case-insensitive), None if it isn't there."""
+    return clan_index[field].get(name.casefold())
+
+
+async def search_for_clan(short_name, second_iter=False, field="short_name"):
+    """Search for a clan by short_name (or tag/long_name through field) in the cached leaderboard.
+    The cache is kept fresh by the background refresher. If the clan is not found on the first iteration, its stalest pages
+    are re-fetched and it tries again. If it is not found in the second iteration, it will return None.
+    Never waits more than MISS_WAIT seconds on the network.
     """
     
     if cache is None:
-        cache = await get_all_clans()
+        start_refresher()
+        await _wait_at_most(_cache_ready.wait(), MISS_WAIT)
 
-    for _page, clan_data in enumerate(cache, start=1):
-        if clan_data:
-            for clan in clan_data:
-                if clan["short_name"] == short_name.lower():
-                    logging.info(f"{short_name} was found in cache")
-                    return clan
+    clan = find_clan(short_name, field)
+    if clan:
+        logging.info(f"{short_name} was found in cache")
+        return clan
 
-    # Condition where it didn't find the clan; refresh cache and try once more
+    # Condition where it didn't find the clan; refresh cache and try once more.
+    # Concurrent misses share one refresh and one retry pass.
     if not second_iter:
-        cache = await get_all_clans()
-        logging.warning(f"{short_name} was not found in cache, retrying")
-        return await search_for_clan(short_name, second_iter=True)
+        logging.warning(f"{short_name} was not found in cache, retrying after a refresh")
+        clan = await _lookup_after_refresh(short_name, field)
+        if clan:
+            return clan
 
-    if second_iter:
-        logging.error(f"{short_name} was not found after both attempts")
-        return None  # Clan not found after second iteration
+    logging.error(f"{short_name} was not found after both attempts")
+    return None  # Clan not found after second iteration
 
 
-async def get_all_clans():
-    """Get all clans from all pages concurrently."""
-    max_pages = 1000
+async def get_all_clans(max_pages=MAX_PAGES, concurrency=CRAWL_CONCURRENCY):
+    """Get all clans, page by page with at most `concurrency` requests in flight over the shared HTTP session.
+    Stops once EMPTY_PAGES_TO_STOP consecutive pages are empty, returns one list of clans (or None) per page."""
+    start_time = time.time()
+    results = [None] * max_pages
+    empty_pages = set()
+    next_page = 1
+    last_page = max_pages
 
-    tasks = [fetch_clan_leaderboard(page) for page in range(1, max_pages + 1)]
-    results = await asyncio.gather(*tasks)
+    def mark_empty(page):
+        nonlocal last_page
+        empty_pages.add(page)
+        run_start, run_end = page, page
+        while run_start - 1 in empty_pages:
+            run_start -= 1
+        while run_end + 1 in empty_pages:
+            run_end += 1
+        if run_end - run_start + 1 >= EMPTY_PAGES_TO_STOP:
+            last_page = min(last_page, run_start - 1)
 
+    async def worker():
+        nonlocal next_page
+        while next_page <= last_page:
+            page = next_page
+            next_page += 1
+            clans = await fetch_clan_leaderboard(page)
+            results[page - 1] = clans
+            if clans == []:
+                mark_empty(page)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    results = results[:max(last_page, 0)]
+    logging.info(f"Crawled {len(results)} leaderboard pages in {time.time() - start_time:.1f} seconds")
     return results
     
+async def main():
+    try:
+        set_cache(await get_all_clans())
+        return await search_for_clan("TKBeS")
+    finally:
+        await HTTP_Client.close_session()
+
+
 if __name__ == "__main__":
-    result = asyncio.run(search_for_clan("TKBeS"))
+    result = asyncio.run(main())
     if result:
         print("Clan found:", result)
     else:
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+from collections import deque, namedtuple
+from datetime import datetime, timedelta, timezone
+
+import zstandard
+from replit.object_storage import Client
+from replit.object_storage.errors import ObjectNotFoundError
+
+client = Client()
+
+# Squadron points sampled at each alarm run, one object per squadron per UTC day:
+#   HISTORY/<squadron>/<YYYY-MM-DD>.json.zst
+# Each object is columnar: sample times and squadron totals as parallel arrays, every member name seen
+# that day once, and member points as [sample, name index, points] changes from the previous sample
+# (points None means the member left). Samples are keyed by squadron only, so guilds tracking the
+# same squadron share one history.
+HISTORY_PREFIX = "HISTORY"
+HISTORY_VERSION = 1
+
+HistorySample = namedtuple("HistorySample", ["timestamp", "total_points", "members"])
+
+_locks = {}  # squadron -> asyncio.Lock, appends to one partition are read-modify-write
+
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).date()
+
+
+def partition_key(squadron_name, day):
+    return f"{HISTORY_PREFIX}/{squadron_name}/{day.isoformat()}.json.zst"
+
+
+def _empty_partition(squadron_name, day):
+    return {"version": HISTORY_VERSION, "squadron": squadron_name, "day": day.isoformat(),
+            "times": [], "totals": [], "names": [], "changes": []}
+
+
+def _read_partition(squadron_name, day):
+    try:
+        data = client.download_as_bytes(partition_key(squadron_name, day))
+    except ObjectNotFoundError:
+        return None
+    partition = json.loads(zstandard.ZstdDecompressor().decompress(data))
+    if partition.get("version") != HISTORY_VERSION:
+        raise ValueError(f"unknown history version {partition.get('version')}")
+    return partition
+
+
+def _write_partition(partition, day):
+    data = json.dumps(partition, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    client.upload_from_bytes(partition_key(partition["squadron"], day), zstandard.ZstdCompressor(level=10).compress(data))
+
+
+def _replay(partition):
+    """Yields a HistorySample per stored sample, rebuilding member points from the changes."""
+    names = partition["names"]
+    changes = partition["changes"]
+    members = {}
+    position = 0
+    for sample, (timestamp, total_points) in enumerate(zip(partition["times"], partition["totals"])):
+        while position < len(changes) and changes[position][0] == sample:
+            _, name_index, points = changes[position]
+            if points is None:
+                members.pop(names[name_index], None)
+            else:
+                members[names[name_index]] = points
+            position += 1
+        yield HistorySample(timestamp, total_points, dict(members))
+
+
+def _append(partition, roster):
+    """Adds roster as the next sample of partition. Returns False if it is already there."""
+    if partition["times"] and partition["times"][-1] >= roster.fetched_at:
+        return False
+
+    last = deque(_replay(partition), maxlen=1)
+    previous = last[0].members if last else {}
+
+    names = partition["names"]
+    name_index = {name: i for i, name in enumerate(names)}
+    sample = len(partition["times"])
+    current = dict(roster.members)
+
+    for name, points in current.items():
+        if previous.get(name) != points:
+            if name not in name_index:
+                name_index[name] = len(names)
+                names.append(name)
+            partition["changes"].append([sample, name_index[name], points])
+    for name in previous.keys() - current.keys():
+        partition["changes"].append([sample, name_index[name], None])
+
+    partition["times"].append(roster.fetched_at)
+    partition["totals"].append(roster.total_points)
+    return True
+
+
+def _record(roster):
+    day = _day(roster.fetched_at)
+    partition = _read_partition(roster.squadron, day) or _empty_partition(roster.squadron, day)
+    if not _append(partition, roster):
+        return False
+    _write_partition(partition, day)
+    return True
+
+
+async def record_roster(roster):
+    """
+    Appends a Roster to its squadron's history. The same fetch is only stored once, so a
+    roster shared by every guild tracking the squadron can be recorded by each of them.
+    Returns True if a sample was added.
+    """
+    lock = _locks.setdefault(roster.squadron, asyncio.Lock())
+    async with lock:
+        added = await asyncio.to_thread(_record, roster)
+    if added:
+        logging.info(f"Recorded points history for {roster.squadron} ({roster.total_points} points)")
+    return added
+
+
+def _load(squadron_name, start, end):
+    samples = []
+    day, last_day = _day(start), _day(end)
+    while day <= last_day:
+        partition = _read_partition(squadron_name, day)
+        if partition:
+            samples.extend(sample for sample in _replay(partition) if start <= sample.timestamp <= end)
+        day += timedelta(days=1)
+    return samples
+
+
+async def load_history(squadron_name, start, end):
+    """Every HistorySample of the squadron with start <= timestamp <= end (unix seconds), oldest first."""
+    return await asyncio.to_thread(_load, squadron_name, start, end)
@@ -0,0 +1,149 @@
+import logging
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+# On the 2560px maps vehicle icons are drawn at int(48 * 2.35) = 112px, ~50 KB each as RGBA,
+# so this holds ~1,300 of them, well over the vehicles that turn up in a day of SQB.
+ICON_CACHE_MAX_BYTES = 64 * 1024 * 1024
+FONT_PATH = "fonts/arial_unicode_ms.otf"
+TEXT_BBOX_CACHE_SIZE = 4096
+# The MAPS/*.jpg backgrounds are 2560x1440, ~14.7 MB each as RGBA, so this keeps the last two maps played
+# per render worker (on top of ICON_CACHE_MAX_BYTES).
+BACKGROUND_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+_icon_cache = OrderedDict()  # (icon_path, size) -> RGBA Image, or None if the file is missing
+_icon_cache_bytes = 0
+
+_font_registry = {}  # (font_path, size) -> FreeTypeFont
+_text_bbox_cache = OrderedDict()  # (text, font_path, size) -> bbox tuple
+_background_cache = OrderedDict()  # (map_image_path, margin) -> RGBA Image with the dark panel already composited
+_background_cache_bytes = 0
+
+
+def _image_bytes(img):
+    if img is None:
+        return 0
+    width, height = img.size
+    return width * height * 4
+
+
+def _store_icon(key, img):
+    global _icon_cache_bytes
+    if key in _icon_cache:
+        _icon_cache_bytes -= _image_bytes(_icon_cache.pop(key))
+
+    _icon_cache[key] = img
+    _icon_cache_bytes += _image_bytes(img)
+
+    # Evict least recently used icons until we are back under the cap
+    while _icon_cache_bytes > ICON_CACHE_MAX_BYTES and len(_icon_cache) > 1:
+        _, evicted = _icon_cache.popitem(last=False)
+        _icon_cache_bytes -= _image_bytes(evicted)
+
+
+def get_icon(icon_path, size):
+    """
+    Returns the icon at icon_path resized to a (size, size) RGBA image, or None if the file doesn't exist
+    or can't be decoded.
+    Each (icon, size) pair is decoded and resampled once, then served from an LRU cache.
+    The returned image is shared, so callers must not draw on it (compositing it onto another image is fine).
+    """
+    key = (icon_path, size)
+    if key in _icon_cache:
+        _icon_cache.move_to_end(key)
+        return _icon_cache[key]
+
+    try:
+        with Image.open(icon_path) as raw:
+            img = raw.convert("RGBA").resize((size, size), Image.Resampling.LANCZOS)
+    except FileNotFoundError:
+        img = None
+    except Exception as e:
+        # Corrupt or unreadable icons are treated like missing ones instead of failing the render
+        logging.error(f"Error loading icon {icon_path}: {e}")
+        img = None
+
+    _store_icon(key, img)
+    return img
+
+
+def clear_icon_cache():
+    global _icon_cache_bytes
+    _icon_cache.clear()
+    _icon_cache_bytes = 0
+
+
+def clear_render_caches():
+    """Drops every cached icon, font, text measurement and background, mostly useful for cold-start benchmarks."""
+    global _background_cache_bytes
+    clear_icon_cache()
+    _font_registry.clear()
+    _text_bbox_cache.clear()
+    _background_cache.clear()
+    _background_cache_bytes = 0
+
+
+def icon_cache_info():
+    return {"entries": len(_icon_cache), "bytes": _icon_cache_bytes, "max_bytes": ICON_CACHE_MAX_BYTES}
+
+
+def get_font(size, font_path=FONT_PATH):
+    """Returns a shared FreeTypeFont for (font_path, size), parsing the font file only the first time."""
+    key = (font_path, size)
+    font = _font_registry.get(key)
+    if font is None:
+        font = ImageFont.truetype(font_path, size)
+        _font_registry[key] = font
+    return font
+
+
+def text_bbox(text, font):
+    """
+    Same result as draw.textbbox((0, 0), text, font=font), memoized per (text, font) so
+    repeated strings like "0" or squadron tags only go through FreeType layout once.
+    """
+    key = (text, font.path, font.size)
+    bbox = _text_bbox_cache.get(key)
+    if bbox is not None:
+        _text_bbox_cache.move_to_end(key)
+        return bbox
+
+    bbox = font.getbbox(text)
+    _text_bbox_cache[key] = bbox
+    if len(_text_bbox_cache) > TEXT_BBOX_CACHE_SIZE:
+        _text_bbox_cache.popitem(last=False)
+    return bbox
+
+
+def _store_background(key, background):
+    global _background_cache_bytes
+    _background_cache[key] = background
+    _background_cache_bytes += _image_bytes(background)
+
+    # Same as the icons, evict least recently used maps but always keep the one just added
+    while _background_cache_bytes > BACKGROUND_CACHE_MAX_BYTES and len(_background_cache) > 1:
+        _, evicted = _background_cache.popitem(last=False)
+        _background_cache_bytes -= _image_bytes(evicted)
+
+
+def get_background(map_image_path, margin):
+    """
+    Returns the map image with the translucent dark panel already composited over it.
+    The returned image is shared, so callers must .copy() it before drawing.
+    """
+    key = (map_image_path, margin)
+    if key in _background_cache:
+        _background_cache.move_to_end(key)
+        return _background_cache[key]
+
+    with Image.open(map_image_path) as raw:
+        background = raw.convert("RGBA")
+    bg_width, bg_height = background.size
+
+    overlay = Image.new("RGBA", (bg_width, bg_height), (255, 255, 255, 0))
+    ImageDraw.Draw(overlay).rectangle([margin, margin, bg_width - margin, bg_height - margin], fill=(0, 0, 0, 150))
+    background = Image.alpha_composite(background, overlay)
+
+    _store_background(key, background)
+    return background
@@ -1,62 +1,86 @@
 import re
 import aiohttp
 import discord
-from bs4 import BeautifulSoup
 import asyncio
+import os
+import time
+from collections import namedtuple
+from lxml import html as lxml_html
+
+import HTTP_Client
 
 # Target URL
 baseURL = 'https://warthunder.com/en/community/claninfo/'
 
+MEMBER_CELL_CLASS = 'squadrons-members__grid-item'
+COUNTER_CLASS = 'squadrons-counter__value'
+NICK_PREFIX = 'en/community/userinfo/?nick='
+
+# Rosters served by get_roster() are reused for this many seconds, so one alarm run scrapes each squadron once
+ROSTER_TTL = 5 * 60
+# Squadron pages scraped at once by get_roster()/get_rosters()
+ROSTER_CONCURRENCY = int(os.environ.get("ROSTER_CONCURRENCY", 4))
+# /sq-info answers from a roster at most this old
+INFO_ROSTER_AGE = 60
+
+Member = namedtuple("Member", ["name", "points"])
+# One scrape of a squadron page, everything else (embeds, snapshots, points comparisons) is derived from it
+Roster = namedtuple("Roster", ["squadron", "members", "total_points", "fetched_at"])
+
+_roster_cache = {}  # squadron name -> last Roster fetched
+_roster_tasks = {}  # squadron name -> fetch in flight, shared by everyone asking for it
+_roster_semaphore = asyncio.Semaphore(ROSTER_CONCURRENCY)
+
 async def getData(squad):
     return await scraper(baseURL + squad)
 
 # Scrapes data from the provided URL using aiohttp
 async def scraper(url):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=60) as response:
-                content = BeautifulSoup(await response.text(), "lxml")
-                return parser(content)
+        async with HTTP_Client.get(url, timeout=aiohttp.ClientTimeout(total=60)) as response:
+            # A 429/5xx or error page would parse as an empty squadron
+            if response.status != 200:
+                print(f"Error raised in 'scraper' function: {url} returned HTTP {response.status}")
+                return None
+            return parse_members(await response.text())
 
     except (aiohttp.ClientError, Exception) as e:
         print(f"Error raised in 'scraper' function: {e}")
         return None
 
 
-# Parses the HTML content and returns a structured dictionary
-def parser(content):
-    players = []
-    total_points = 0
-    counter = 0
-    name, points = None, None  # Initialize variables
-
-    # Extract total points
-    total_points_tag = content.find('div', class_='squadrons-counter__value')
-    if total_points_tag:
-        total_points = int(total_points_tag.text.strip())
-
-    for dataItem in content.findAll(
-            'div', attrs={"class": "squadrons-members__grid-item"}):
-        if counter == 7:  # Get player name from the link element.
-            name = (dataItem.find('a').get('href')).replace(
-                'en/community/userinfo/?nick=', '')
-        elif counter == 8:  # Get player points
-            points = re.sub(r'\s+', '', dataItem.text)
-        elif counter == 12:
-            if name and points:
-                players.append({
-                    'name': name,
-                    'points': int(points) if points.isdigit() else 0
-                })
-            counter = 6  # Reset counter for the next entry
-        counter += 1
-
-    # Ensure the last player is included
-    if name and points and {'name': name, 'points': int(points) if points.isdigit() else 0} not in players:
-        players.append({'name': name, 'points': int(points) if points.isdigit() else 0})
-
-    #print(f"Players: {players}")
-    return players, total_points
+def parse_members(html):
+    """
+    Fast path for a claninfo page: lxml builds the tree in C and only the member grid cells and
+    the points counter are visited, with no BeautifulSoup objects made for the rest of the page.
+    Returns ([Member(name, points), ...], total_points), same members and order as the old
+    BeautifulSoup parser kept in SQ_Info_Bench.py, or None if the page has no member grid or
+    points counter (an error or not found page).
+    """
+    tree = lxml_html.fromstring(html)
+
+    counter = tree.find_class(COUNTER_CLASS)
+    cells = tree.find_class(MEMBER_CELL_CLASS)
+    if not counter or not cells:
+        return None
+    total_points = int(counter[0].text_content().strip())
+
+    members = []
+    name = None
+    for cell in cells:
+        # Each row is [#, nick link, points, activity, role, join date], points follow the cell with the link
+        if name is not None:
+            points = re.sub(r'\s+', '', cell.text_content())
+            if points:
+                members.append(Member(name, int(points) if points.isdigit() else 0))
+            name = None
+            continue
+
+        link = cell.find('.//a[@href]')
+        if link is not None and NICK_PREFIX in link.get('href'):
+            name = link.get('href').replace(NICK_PREFIX, '')
+
+    return members, total_points
 
 
 # Generates a summary report
@@ -65,22 +89,27 @@ def generate_summary(players, total_points):
     return {'total_points': total_points, 'total_members': total_members}
 
 
+def roster_points(roster):
+    """{name: points} for every member of the roster."""
+    return dict(roster.members)
+
+
 def create_embed(players, summary, squadron_name, embed_type=None):
     embed = discord.Embed(title=f"Squadron Info: {squadron_name}",
                           color=0x00ff00)
 
     if embed_type in ["members", "logs"]:
         players_sorted = sorted(players,
-                                key=lambda x: x['points'],
+                                key=lambda x: x.points,
                                 reverse=True)
 
         # Skip escaping for "logs" type
         if embed_type == "logs":
-            player_list = [player['name'] for player in players_sorted]
+            player_list = [player.name for player in players_sorted]
         else:
             player_list = [
-                player['name'].replace('_', '\\_') +
-                f": {player['points']} points" for player in players_sorted
+                player.name.replace('_', '\\_') +
+                f": {player.points} points" for player in players_sorted
             ]
 
         player_chunks = []
@@ -113,10 +142,10 @@ def create_embed(players, summary, squadron_name, embed_type=None):
                         inline=False)
 
         players_sorted = sorted(players,
-                                key=lambda x: x['points'],
+                                key=lambda x: x.points,
                                 reverse=True)
         player_list = [
-            player['name'].replace('_', '\\_') + f": {player['points']} points"
+            player.name.replace('_', '\\_') + f": {player.points} points"
             for player in players_sorted
         ]
 
@@ -140,15 +169,63 @@ def create_embed(players, summary, squadron_name, embed_type=None):
     return embed
 
 
-async def fetch_squadron_info(squadron_name, embed_type=None):
+async def fetch_roster(squadron_name):
+    """Scrapes a squadron's members and total points into a Roster, or None if the page couldn't be fetched."""
     squad = squadron_name.replace(" ", "%20")
-    players, total_points = await getData(squad)
-    if players is not None:
-        summary = generate_summary(players, total_points)
-        embed = create_embed(players, summary, squadron_name, embed_type)
-        return embed
-    else:
+    result = await getData(squad)
+    if result is None:
+        return None
+    members, total_points = result
+    return Roster(squadron_name, tuple(members), total_points, time.time())
+
+
+async def _fetch_roster_limited(squadron_name):
+    async with _roster_semaphore:
+        roster = await fetch_roster(squadron_name)
+    if roster is not None:
+        # Drop rosters nobody asked for in a while before adding the new one
+        now = time.time()
+        for name in [name for name, cached in _roster_cache.items() if now - cached.fetched_at > ROSTER_TTL]:
+            del _roster_cache[name]
+        _roster_cache[squadron_name] = roster
+    return roster
+
+
+async def get_roster(squadron_name, max_age=ROSTER_TTL):
+    """
+    Roster of squadron_name at most max_age seconds old. Served from memory when possible,
+    otherwise callers asking for the same squadron at the same time share a single scrape.
+    """
+    roster = _roster_cache.get(squadron_name)
+    if roster is not None and time.time() - roster.fetched_at < max_age:
+        return roster
+
+    task = _roster_tasks.get(squadron_name)
+    if task is None:
+        task = asyncio.create_task(_fetch_roster_limited(squadron_name))
+        _roster_tasks[squadron_name] = task
+        task.add_done_callback(lambda _, name=squadron_name: _roster_tasks.pop(name, None))
+    # Shielded so one caller being cancelled doesn't cancel the scrape for the others
+    return await asyncio.shield(task)
+
+
+async def get_rosters(squadron_names, max_age=ROSTER_TTL):
+    """{name: Roster or None} for every distinct name, scraped concurrently (at most ROSTER_CONCURRENCY at once)."""
+    names = list(dict.fromkeys(squadron_names))
+    rosters = await asyncio.gather(*[get_roster(name, max_age) for name in names])
+    return dict(zip(names, rosters))
+
+
+def roster_embed(roster, embed_type=None):
+    summary = generate_summary(roster.members, roster.total_points)
+    return create_embed(roster.members, summary, roster.squadron, embed_type)
+
+
+async def fetch_squadron_info(squadron_name, embed_type=None):
+    roster = await get_roster(squadron_name, max_age=INFO_ROSTER_AGE)
+    if roster is None:
         return None
+    return roster_embed(roster, embed_type)
 
 
 def test_main():
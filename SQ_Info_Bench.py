@@ -0,0 +1,131 @@
+"""
+Offline benchmark of the claninfo page parsers, no network needed.
+
+    python SQ_Info_Bench.py --iterations 50
+    python SQ_Info_Bench.py --html saved/EXLY.html saved/OP2.html
+
+Without --html it builds claninfo-like pages (nav, scripts and footer around the member grid)
+for squadrons of several sizes. Pages saved from the browser can be passed with --html instead.
+Each page is parsed with the old full-page parser() and with parse_members(), the results are
+checked to match and the time per page of each is printed.
+"""
+import argparse
+import random
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+from SQ_Info import parse_members
+
+FIXTURE_SIZES = [12, 64, 128]
+
+FIXTURE_NICKS = [
+    "bullpuppyヅ", "ядерный_пивас", "doodleZzz", "skyline地平", "Diablo_Kraike", "SchweinHotep@live",
+    "ГРЕШНИК", "_vavord_@psn", "who_is_Red_Eagle", "Red__Eagle", "Mistress BUBA", "34531",
+]
+
+
+def fixture_page(members, seed=0):
+    """A claninfo page with `members` rows, laid out like warthunder.com's member grid."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(members):
+        nick = f"{FIXTURE_NICKS[i % len(FIXTURE_NICKS)]}{i}"
+        points = rng.randrange(0, 2500)
+        rows.append(
+            f'<div class="squadrons-members__grid-item">{i + 1}</div>'
+            f'<div class="squadrons-members__grid-item"><a href="en/community/userinfo/?nick={nick}">{nick}</a></div>'
+            f'<div class="squadrons-members__grid-item">\n    {points}\n</div>'
+            f'<div class="squadrons-members__grid-item">{rng.randrange(0, 400)}</div>'
+            f'<div class="squadrons-members__grid-item">{rng.choice(["Private", "Sergeant", "Officer", "Commander"])}</div>'
+            f'<div class="squadrons-members__grid-item">{rng.randrange(1, 28):02d}.0{rng.randrange(1, 9)}.2024</div>'
+        )
+    header = "".join(f'<div class="squadrons-members__grid-item">{title}</div>'
+                     for title in ["num.", "Player", "Personal clan rating", "Activity", "Role", "Date of entry"])
+
+    nav = "".join(f'<li class="nav__item"><a href="/en/news/{i}">News item {i}</a></li>' for i in range(200))
+    scripts = "".join(f'<script>window.__data{i} = {{"key": "{"x" * 200}"}};</script>' for i in range(30))
+    footer = "".join(f'<p class="footer__text">Footer paragraph {i} {"lorem ipsum " * 20}</p>' for i in range(60))
+    return (
+        f'<html><head><title>Squadron</title>{scripts}</head><body>'
+        f'<nav><ul>{nav}</ul></nav>'
+        f'<div class="squadrons-counter"><div class="squadrons-counter__value">{rng.randrange(10000, 60000)}</div></div>'
+        f'<div class="squadrons-members__grid">{header}{"".join(rows)}</div>'
+        f'<footer>{footer}</footer></body></html>'
+    )
+
+
+# The full-page BeautifulSoup parser SQ_Info used before parse_members(), kept as the reference to compare against
+def parser(content):
+    players = []
+    total_points = 0
+    counter = 0
+    name, points = None, None  # Initialize variables
+
+    # Extract total points
+    total_points_tag = content.find('div', class_='squadrons-counter__value')
+    if total_points_tag:
+        total_points = int(total_points_tag.text.strip())
+
+    for dataItem in content.findAll(
+            'div', attrs={"class": "squadrons-members__grid-item"}):
+        if counter == 7:  # Get player name from the link element.
+            name = (dataItem.find('a').get('href')).replace(
+                'en/community/userinfo/?nick=', '')
+        elif counter == 8:  # Get player points
+            points = re.sub(r'\s+', '', dataItem.text)
+        elif counter == 12:
+            if name and points:
+                players.append({
+                    'name': name,
+                    'points': int(points) if points.isdigit() else 0
+                })
+            counter = 6  # Reset counter for the next entry
+        counter += 1
+
+    # Ensure the last player is included
+    if name and points and {'name': name, 'points': int(points) if points.isdigit() else 0} not in players:
+        players.append({'name': name, 'points': int(points) if points.isdigit() else 0})
+
+    #print(f"Players: {players}")
+    return players, total_points
+
+
+def time_per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return (time.perf_counter() - start) / iterations, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark claninfo page parsing")
+    arg_parser.add_argument("--iterations", type=int, default=20, help="parses of each page per parser")
+    arg_parser.add_argument("--html", nargs="*", default=[], help="saved claninfo pages to use instead of generated ones")
+    args = arg_parser.parse_args()
+
+    if args.html:
+        pages = []
+        for path in args.html:
+            with open(path, "r", encoding="utf-8") as f:
+                pages.append((path, f.read()))
+    else:
+        pages = [(f"{size} members", fixture_page(size, seed=size)) for size in FIXTURE_SIZES]
+
+    print(f"{'page':<24}{'KiB':>8}{'parser()':>14}{'parse_members()':>18}{'speedup':>10}")
+    for label, html in pages:
+        if parse_members(html) is None:
+            print(f"{label}: no member grid or points counter, skipped")
+            continue
+        full_time, (players, total_points) = time_per_call(lambda html=html: parser(BeautifulSoup(html, "lxml")), args.iterations)
+        fast_time, (members, fast_total) = time_per_call(lambda html=html: parse_members(html), args.iterations)
+
+        if [member._asdict() for member in members] != players or fast_total != total_points:
+            print(f"{label}: parsers disagree ({len(members)} vs {len(players)} members, {fast_total} vs {total_points} points)")
+
+        print(f"{label:<24}{len(html.encode()) / 1024:8.1f}{full_time * 1000:11.2f} ms{fast_time * 1000:15.2f} ms{full_time / fast_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,188 @@
 import asyncio
+import io
+import logging
+import multiprocessing
+import os
 import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
 from Data_Parser import get_dict_from_list
+from Render_Cache import get_background, get_font, get_icon, text_bbox
+
+# Number of worker processes drawing scoreboards, 0 renders in a thread of this process instead.
+# Kept small by default: cpu_count() reports the shared host's cores, and every worker holds its own
+# background and icon caches.
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+
+HEADER_ICONS = {
+    "Air": "ICONS/fighter_icon.png",
+    "Ground": "ICONS/tank_icon.png",
+    "Assists": "ICONS/assists_icon.png",
+    "Deaths": "ICONS/deaths_icon.png",
+    "Caps": "ICONS/cap_icon.png"
+}
+
+VEHICLE_TEXT_REFERENCE = "Ag"
+
+# Format the boards are uploaded in: png, png8 (256 colour palette), webp or jpeg. Guilds can override it with /scoreboard-format
+SCOREBOARD_FORMAT = os.environ.get("SCOREBOARD_FORMAT", "png")
+# Boards wider than this are downscaled before upload, 0 keeps the map resolution
+SCOREBOARD_MAX_WIDTH = int(os.environ.get("SCOREBOARD_MAX_WIDTH", 0))
+SCOREBOARD_FORMATS = {
+    "png": "png",
+    "png8": "png",
+    "webp": "webp",
+    "jpeg": "jpg",
+}
+ENCODED_CACHE_SIZE = 32
+
+_render_pool = None
+_encoded_cache = OrderedDict()  # (path, mtime, format, max_width) -> encoded bytes
+
+
+class RenderTimer:
+    """Accumulates how long a render spends in each phase, lap() charges the time since the previous lap."""
+
+    def __init__(self):
+        self.phases = {}
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+
+def font_sizes(bg_width):
+    """Font sizes used on a scoreboard drawn over a map of the given width."""
+    return {
+        "title": int(bg_width * 0.03),
+        "team": int(bg_width * 0.03),
+        "body": int(bg_width * 0.019),
+        "stat": int(bg_width * 0.022),
+        "comp": int(bg_width * 0.018),
+        "info": int(bg_width * 0.015),
+    }
+
+
+def _warm_render_worker():
+    """Process pool initializer, loads every font and header icon size the known maps will ask for."""
+    try:
+        widths = set()
+        for name in os.listdir("MAPS"):
+            with Image.open(f"MAPS/{name}") as img:  # only reads the header
+                widths.add(img.width)
+
+        for width in widths:
+            sizes = font_sizes(width)
+            for size in sizes.values():
+                get_font(size)
+            for icon_file in HEADER_ICONS.values():
+                get_icon(icon_file, int(sizes["stat"] * 1.5))
+    except Exception as e:
+        logging.error(f"Error warming render worker: {e}")
+
+
+def get_render_pool():
+    global _render_pool
+    if _render_pool is None and RENDER_WORKERS > 0:
+        # The bot is threaded by the time it first renders, forking it directly can deadlock the workers.
+        # _warm_render_worker() fills the caches, so they don't need anything from the parent.
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, initializer=_warm_render_worker,
+                                           mp_context=multiprocessing.get_context("forkserver"))
+        logging.info(f"Started scoreboard render pool with {RENDER_WORKERS} workers")
+    return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
 
 
 async def create_scoreboard(match_details, winning_team, team1_details, team2_details, map_file, output_path):
+    """
+    Renders the scoreboard off the event loop and returns output_path once the PNG is written.
+    Vehicle names are taken from each player's "vehicle_new".
+    """
+    await create_scoreboards(match_details, winning_team, team1_details, team2_details, map_file, {output_path: None})
+    return output_path
+
+
+async def create_scoreboards(match_details, winning_team, team1_details, team2_details, map_file, outputs):
+    """
+    Renders one scoreboard per entry of outputs ({output_path: {internal vehicle: display name}}) off the event loop.
+    The layout is drawn once and only the vehicle names differ between outputs, so every language
+    of a session should be rendered in a single call. All arguments pickle straight into a render worker.
+    """
+    args = (match_details, winning_team, team1_details, team2_details, map_file, outputs)
+    pool = get_render_pool()
+    if pool is None:
+        return await asyncio.to_thread(render_scoreboards, *args)
+
+    global _render_pool
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, render_scoreboards, *args)
+    except BrokenProcessPool:
+        # A worker died (OOM, killed), start a fresh pool next time and finish this one in a thread
+        logging.error("Scoreboard render pool broke, rendering in a thread instead")
+        if _render_pool is pool:
+            _render_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        return await asyncio.to_thread(render_scoreboards, *args)
+
+
+def render_scoreboards(match_details, winning_team, team1_details, team2_details, map_file, outputs, timer=None):
     """
     Creates a full-screen scoreboard with very large text, covering the entire image.
     Column headers for the stat columns are replaced by icons based on a custom mapping.
     The team name now appears only in the table header (first column), drawn with a larger
     font, and if that team is the winner, it is rendered in a golden color.
+    Everything except the vehicle names is drawn once, then each output gets its own copy with
+    the names from its vehicle_names dict (None means use the players' "vehicle_new").
+    Pass a RenderTimer to get a per-phase breakdown of the render.
     """
+    timer = timer or RenderTimer()
 
     # --- Load Background ---
     map_file = re.sub(r"^\s*\[[^]]+\]\s*", "", map_file)
     map_name = map_file
     map_file = map_file.replace(" ", "_")
     map_image_path = f"MAPS/{map_file}.jpg"
-    background = Image.open(map_image_path).convert("RGBA")
-    bg_width, bg_height = background.size
-
-    # Create overlay covering the entire image
-    overlay = Image.new("RGBA", (bg_width, bg_height), (255, 255, 255, 0))
-    draw = ImageDraw.Draw(overlay)
 
+    # The map with its dark panel is cached, so we only draw text and icons on a copy of it
     margin = 30
-    draw.rectangle([margin, margin, bg_width - margin, bg_height - margin], fill=(0, 0, 0, 150))
-
-    # Font sizes and paths
-    TITLE_FONT_SIZE = int(bg_width * 0.03)
-    TEAM_FONT_SIZE  = int(bg_width * 0.03)
-    BODY_FONT_SIZE  = int(bg_width * 0.019)
-    STAT_FONT_SIZE  = int(bg_width * 0.022)
-    COMP_FONT_SIZE = int(bg_width * 0.018)
+    board = get_background(map_image_path, margin).copy()
+    bg_width = board.width
+    draw = ImageDraw.Draw(board)
+    timer.lap("background")
+
+    # Font sizes
+    sizes = font_sizes(bg_width)
+    TITLE_FONT_SIZE = sizes["title"]
+    TEAM_FONT_SIZE  = sizes["team"]
+    BODY_FONT_SIZE  = sizes["body"]
+    STAT_FONT_SIZE  = sizes["stat"]
+    COMP_FONT_SIZE = sizes["comp"]
     
 
-    font_path = "fonts/arial_unicode_ms.otf"
-    font_title = ImageFont.truetype(font_path, TITLE_FONT_SIZE)
-    font_team  = ImageFont.truetype(font_path, TEAM_FONT_SIZE)
-    font_body  = ImageFont.truetype(font_path, BODY_FONT_SIZE)
-    stat_font  = ImageFont.truetype(font_path, STAT_FONT_SIZE)
-    comp_font  = ImageFont.truetype(font_path, COMP_FONT_SIZE)
-
-    resample_filter = Image.Resampling.LANCZOS
+    font_title = get_font(TITLE_FONT_SIZE)
+    font_team  = get_font(TEAM_FONT_SIZE)
+    font_body  = get_font(BODY_FONT_SIZE)
+    stat_font  = get_font(STAT_FONT_SIZE)
+    comp_font  = get_font(COMP_FONT_SIZE)
 
     # --- Draw match_details (human-readable) in small text, top-right ---
-    INFO_FONT_SIZE = int(bg_width * 0.015)
-    info_font      = ImageFont.truetype(font_path, INFO_FONT_SIZE)
+    INFO_FONT_SIZE = sizes["info"]
+    info_font      = get_font(INFO_FONT_SIZE)
+    timer.lap("fonts")
     padding        = 15
 
     # convert epoch to human-readable UTC
@@ -59,13 +192,13 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
     sid_text = f"{match_details['session_id']}"
 
     # position timestamp
-    ts_bbox = draw.textbbox((0,0), ts_text, font=info_font)
+    ts_bbox = text_bbox(ts_text, info_font)
     x_ts    = bg_width - margin - (ts_bbox[2]-ts_bbox[0]) - padding
     y_ts    = margin + padding
     draw.text((x_ts, y_ts), ts_text, font=info_font, fill=(200,200,200,255))
 
     # position session ID below it
-    sid_bbox = draw.textbbox((0,0), sid_text, font=info_font)
+    sid_bbox = text_bbox(sid_text, info_font)
     x_sid    = bg_width - margin - (sid_bbox[2]-sid_bbox[0]) - padding
     line_spacing = 15   # ← play with this number
     y_sid = y_ts + (ts_bbox[3] - ts_bbox[1]) + line_spacing
@@ -80,7 +213,7 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
     y = 50
 
     # Draw centered map name
-    title_bbox  = draw.textbbox((0, 0), title_text, font=font_title)
+    title_bbox  = text_bbox(title_text, font_title)
     title_width = title_bbox[2] - title_bbox[0]
     x_center    = (bg_width - title_width) // 2
     draw.text((x_center, y), title_text, font=font_title, fill=(255, 255, 255, 255))
@@ -88,7 +221,7 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
     y += title_height + 40
 
     # Draw centered winner text
-    win_bbox   = draw.textbbox((0, 0), win_text, font=font_title)
+    win_bbox   = text_bbox(win_text, font_title)
     win_width  = win_bbox[2] - win_bbox[0]
     x_center   = (bg_width - win_width) // 2
     draw.text((x_center, y), win_text, font=font_title, fill=(255, 215, 0, 255))
@@ -100,6 +233,8 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
     gap_between = 40
     col_width   = (bg_width - (x_start * 2) - gap_between) // 2
 
+    # (x, y, player, fill) for every vehicle name, drawn per output once the shared layout is done
+    vehicle_slots = []
 
     def draw_team(team_data, start_x, start_y, section_width):
         # Get team name (squadron) and set starting y_offset.
@@ -115,7 +250,7 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
         # --- Draw comp notation next to squadron header ---
         comp_order = [("F", "Fighters"), ("B", "Bombers"), ("H", "Helicopters"), ("T", "Tanks"), ("AA", "AA")]
         # measure the width of the squadron text so we know where to start
-        squad_bbox   = draw.textbbox((0, 0), squadron, font=font_team)
+        squad_bbox   = text_bbox(squadron, font_team)
         squad_width  = squad_bbox[2] - squad_bbox[0]
         # x,y to drop our little comp tags
         comp_x       = start_x + squad_width + 20
@@ -129,7 +264,7 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
             if cnt > 0:
                 txt = f"{code}{cnt}"
                 draw.text((comp_x, comp_y), txt, font=comp_font, fill=(255,255,255,255))
-                width = draw.textbbox((0,0), txt, font=comp_font)[2]
+                width = text_bbox(txt, comp_font)[2]
                 comp_x += width + 15
 
         
@@ -150,26 +285,20 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
             col_positions.append(col_x)
     
         # ----- Draw Column Headers (with icons for stat columns) -----
-        icon_mapping = {
-            "Air": "ICONS/fighter_icon.png",
-            "Ground": "ICONS/tank_icon.png",
-            "Assists": "ICONS/assists_icon.png",
-            "Deaths": "ICONS/deaths_icon.png",
-            "Caps": "ICONS/cap_icon.png"
-        }
+        icon_mapping = HEADER_ICONS
         icon_size = int(STAT_FONT_SIZE * 1.5)
+        timer.lap("text")
     
         for i, col_name in enumerate(columns):
             icon_file = icon_mapping.get(col_name)
             if icon_file:
-                try:
-                    icon_img = Image.open(icon_file).convert("RGBA")
-                    icon_img = icon_img.resize((icon_size, icon_size), resample_filter)
+                icon_img = get_icon(icon_file, icon_size)
+                if icon_img is not None:
                     icon_shift = 20  # shift icons to the left
                     icon_y_offset = 20  # shift icons down
-                    overlay.paste(icon_img, (col_positions[i] - icon_shift, y_offset + icon_y_offset), icon_img)
-                except Exception as e:
-                    print(e)
+                    board.alpha_composite(icon_img, dest=(col_positions[i] - icon_shift, y_offset + icon_y_offset))
+                else:
+                    print(f"Missing header icon: {icon_file}")
                     draw.text((col_positions[i], y_offset), col_name, font=stat_font, fill=(200, 200, 200, 255))
             else:
                 # For the first column (team name), use a larger font and golden if winner.
@@ -180,6 +309,7 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
                     draw.text((col_positions[i], y_offset), col_name, font=stat_font, fill=(200, 200, 200, 255))
         row_height = icon_size + 10
         y_offset += row_height + 20
+        timer.lap("icons")
     
         # --- Sort players by score in descending order ---
         players_sorted = sorted(team_data.get("players", []), key=lambda player: int(player.get("score", 0)), reverse=True)
@@ -194,28 +324,21 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
             player_name = player_name.replace("@live", "")
             player_name = player_name.replace("@psn", "")
             
-            player_vehicle = player.get("vehicle_new", "")
-            player_vehicle = player_vehicle.replace("Weizman's ", "")
-            player_vehicle = player_vehicle.replace("Plagis' ", "")
-
-            
             vehicle_img_name = player.get("vehicle", "")
             vehicle_icon_img = None
             vehicle_icon_size = int(BODY_FONT_SIZE * 2.35)
             
+            timer.lap("text")
             if vehicle_img_name:
-                vehicle_icon_path = f"ICONS/{vehicle_img_name.lower()}.png"
-                try:
-                    vehicle_icon_img = Image.open(vehicle_icon_path).convert("RGBA")
-                    vehicle_icon_img = vehicle_icon_img.resize((vehicle_icon_size, vehicle_icon_size), resample_filter)
-                except FileNotFoundError:
-                    # Leave vehicle_icon_img as None if the file isn't found.
-                    vehicle_icon_img = None
+                # None if the file isn't found; misses are cached too.
+                vehicle_icon_img = get_icon(f"ICONS/{vehicle_img_name.lower()}.png", vehicle_icon_size)
+            timer.lap("icons")
     
             # Compute bounding boxes for the texts
-            name_bbox = draw.textbbox((0, 0), player_name, font=font_body)
+            name_bbox = text_bbox(player_name, font_body)
             name_height = name_bbox[3] - name_bbox[1]
-            vehicle_bbox = draw.textbbox((0, 0), player_vehicle, font=font_body)
+            # Measured on a fixed string so the row layout is the same in every language
+            vehicle_bbox = text_bbox(VEHICLE_TEXT_REFERENCE, font_body)
             vehicle_height = vehicle_bbox[3] - vehicle_bbox[1]
             identity_height = name_height + 5 + vehicle_height
     
@@ -233,16 +356,18 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
             text_x = col_positions[0] + vehicle_icon_size + gap_between_icon_and_text
     
             # Paste the vehicle icon if it is loaded successfully.
+            timer.lap("text")
             if vehicle_icon_img is not None:
-                overlay.paste(vehicle_icon_img, (icon_x - 15, icon_y + 15), vehicle_icon_img)
+                board.alpha_composite(vehicle_icon_img, dest=(icon_x - 15, icon_y + 15))
+            timer.lap("icons")
     
-            # Draw the player's name and vehicle text.
+            # Draw the player's name, the vehicle text is drawn per output below.
             draw.text((text_x, text_y), player_name, font=font_body, fill=Username_fill)
             
             if int(player.get("deaths", 0)) > 0:
-                draw.text((text_x, text_y + name_height + 10), player_vehicle, font=font_body, fill=Dead_vehicle_fill)
+                vehicle_slots.append((text_x, text_y + name_height + 10, player, Dead_vehicle_fill))
             else:
-                draw.text((text_x, text_y + name_height + 10), player_vehicle, font=font_body, fill=Living_vehicle_fill)
+                vehicle_slots.append((text_x, text_y + name_height + 10, player, Living_vehicle_fill))
     
             # Stat values for columns: Air, Ground, Assists, Deaths, Caps
             stat_values = [
@@ -252,7 +377,7 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
                 int(player.get("deaths", 0)),
                 int(player.get("captures", 0)),
             ]
-            stat_bbox   = draw.textbbox((0, 0), "0", font=stat_font)
+            stat_bbox   = text_bbox("0", stat_font)
             stat_height = stat_bbox[3] - stat_bbox[1]
 
             # Column names in the same order as stat_values
@@ -277,19 +402,89 @@ async def create_scoreboard(match_details, winning_team, team1_details, team2_de
                     fill=fill
                 )
             y_offset += row_height + 10
+        timer.lap("text")
     
     # Draw Team 1 (left column)
     draw_team(team1_details, x_start, y_start, col_width)
     # Draw Team 2 (right column)
     draw_team(team2_details, x_start + col_width + gap_between, y_start, col_width)
-    
-    # Merge overlay onto background and save
-    final_img = Image.alpha_composite(background, overlay)
-    final_img.save(output_path)
+
+    paths = list(outputs)
+    for i, output_path in enumerate(paths):
+        vehicle_names = outputs[output_path]
+        # The last output can take the shared layout itself instead of a copy
+        image = board if i == len(paths) - 1 else board.copy()
+        image_draw = ImageDraw.Draw(image)
+        timer.lap("composite")
+
+        for x, y, player, fill in vehicle_slots:
+            if vehicle_names is None:
+                player_vehicle = player.get("vehicle_new", "")
+            else:
+                player_vehicle = vehicle_names.get(player.get("vehicle", ""), "")
+            player_vehicle = player_vehicle.replace("Weizman's ", "")
+            player_vehicle = player_vehicle.replace("Plagis' ", "")
+            image_draw.text((x, y), player_vehicle, font=font_body, fill=fill)
+        timer.lap("text")
+
+        image.save(output_path)
+        timer.lap("encode")
+    return paths
     
 
 
 
+def encode_scoreboard(path, image_format, max_width):
+    """Re-encodes a rendered scoreboard PNG into image_format, downscaling it to max_width if it is wider."""
+    with Image.open(path) as raw:
+        img = raw.convert("RGBA")
+
+    if max_width and img.width > max_width:
+        height = round(img.height * max_width / img.width)
+        img = img.resize((max_width, height), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    if image_format == "png8":
+        img.convert("RGB").quantize(colors=256).save(buffer, "PNG", optimize=True)
+    elif image_format == "webp":
+        img.save(buffer, "WEBP", quality=90, method=4)
+    elif image_format == "jpeg":
+        img.convert("RGB").save(buffer, "JPEG", quality=90, optimize=True, subsampling=0)
+    else:
+        img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def get_scoreboard_upload(path, image_format=None, max_width=None):
+    """
+    Returns (bytes, filename) of the scoreboard at path in the requested format.
+    Encodes are cached, so every channel receiving the same board in the same format shares one encode.
+    """
+    image_format = image_format or SCOREBOARD_FORMAT
+    if image_format not in SCOREBOARD_FORMATS:
+        logging.warning(f"Unknown scoreboard format {image_format}, using png")
+        image_format = "png"
+    if max_width is None:
+        max_width = SCOREBOARD_MAX_WIDTH
+    filename = f"game_result.{SCOREBOARD_FORMATS[image_format]}"
+
+    key = (path, os.path.getmtime(path), image_format, max_width)
+    if key in _encoded_cache:
+        _encoded_cache.move_to_end(key)
+        return _encoded_cache[key], filename
+
+    if image_format == "png" and not max_width:
+        with open(path, "rb") as f:
+            data = f.read()
+    else:
+        data = await asyncio.to_thread(encode_scoreboard, path, image_format, max_width)
+
+    _encoded_cache[key] = data
+    if len(_encoded_cache) > ENCODED_CACHE_SIZE:
+        _encoded_cache.popitem(last=False)
+    return data, filename
+
+
 # Example usage:
 async def test():
     team1 = {
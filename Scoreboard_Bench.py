@@ -0,0 +1,142 @@
+"""
+Offline benchmark for scoreboard rendering, no network or Discord needed.
+
+    python Scoreboard_Bench.py --iterations 5
+
+Renders fixed 8v8 lineups (CJK/Cyrillic/console nicknames, a disconnected player with no icon)
+over several maps in every language of units.csv, and prints per-phase timings, renders per
+second, the size/time of each upload encoding and the peak RSS of the process.
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from Data_Parser import LangTableReader, lang_table
+from Render_Cache import clear_render_caches
+from Scoreboard import (
+    SCOREBOARD_FORMATS,
+    RenderTimer,
+    encode_scoreboard,
+    render_scoreboards,
+)
+
+BENCH_MAPS = [
+    " [Domination] Abandoned Factory",
+    " [Conquest] Sun City",
+    " [Battle] Fields of Poland (winter)",
+    " [Domination] Battle of Hürtgen Forest",
+]
+
+BENCH_NICKS = [
+    "bullpuppyヅ", "ядерный пивас", "doodleZzz", "skyline地平",
+    "Diablo_Kraike", "SchweinHotep@live", "ГРЕШНИК", "_vavord_@psn",
+    "who_is_Red_Eagle", "ГамбитВорБолтов", "Red__Eagle", "한국의조종사",
+    "Всосал", "34531", "Mistress BUBA", "飛行員小明",
+]
+
+# DISCONNECTED is what the bot stores for players without a vehicle, it has no icon
+BENCH_VEHICLES = [
+    "spitfire_ix", "jp_m4a3e8_76w_sherman", "spitfire_ix_usa", "tu-2_postwar_late",
+    "germ_pzkpfw_VI_ausf_h1_tiger", "cn_type_58", "spitfire_mk18e", "DISCONNECTED",
+    "spitfire_lf_mk9e_weisman", "germ_pzkpfw_VI_ausf_h1_tiger", "ussr_is_1", "fr_tpk_641_vpc",
+    "tu-2", "ah_64a", "spitfire_ix", "f_16a_block_10",
+]
+
+
+def make_team(squadron, offset):
+    players = []
+    for i in range(8):
+        n = offset + i
+        players.append({
+            "uid": 1000 + n,
+            "nick": BENCH_NICKS[n],
+            "index": n,
+            "vehicle": BENCH_VEHICLES[n],
+            "vehicle_new": BENCH_VEHICLES[n],
+            "air_kills": n % 3,
+            "ground_kills": (n * 7) % 4,
+            "assists": n % 2,
+            "deaths": (n + 1) % 2,
+            "captures": int(n % 5 == 0),
+            "score": 100 * ((n * 37) % 9),
+        })
+    return {"squadron": squadron, "players": players}
+
+
+def vehicle_names(language):
+    translate = LangTableReader(language)
+    names = {}
+    for vehicle in BENCH_VEHICLES:
+        try:
+            names[vehicle] = translate.get_translate(vehicle + "_shop")
+        except KeyError:
+            names[vehicle] = vehicle
+    return names
+
+
+def print_phases(title, phases, renders):
+    total = sum(phases.values())
+    print(f"\n{title}")
+    for phase, seconds in sorted(phases.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {phase:<12}{seconds / renders * 1000:9.2f} ms/render  {seconds / total * 100:5.1f}%")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark scoreboard rendering")
+    arg_parser.add_argument("--iterations", type=int, default=3, help="warm passes over every map")
+    args = arg_parser.parse_args()
+
+    team1 = make_team("9615", 0)
+    team2 = make_team("OP2", 8)
+    match_details = {"utc_timestamp": "1746424038", "session_id": "4acb2a60017e0f6"}
+    languages = list(lang_table.languages())
+    names_by_language = {language: vehicle_names(language) for language in languages}
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        def outputs_for(map_index):
+            return {
+                os.path.join(out_dir, f"{map_index}-{i}.png"): names_by_language[language]
+                for i, language in enumerate(languages)
+            }
+
+        # Cold: nothing cached, one language, what the first board after a restart costs
+        cold = RenderTimer()
+        for map_index, map_file in enumerate(BENCH_MAPS):
+            clear_render_caches()
+            render_scoreboards(match_details, "9615", team1, team2, map_file,
+                               {os.path.join(out_dir, f"cold-{map_index}.png"): None}, timer=cold)
+        print_phases(f"Cold renders ({len(BENCH_MAPS)} maps)", cold.phases, len(BENCH_MAPS))
+
+        # Warm: every language of a session per call, like auto_logging does
+        warm = RenderTimer()
+        renders = 0
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            for map_index, map_file in enumerate(BENCH_MAPS):
+                outputs = outputs_for(map_index)
+                render_scoreboards(match_details, "9615", team1, team2, map_file, outputs, timer=warm)
+                renders += len(outputs)
+        elapsed = time.perf_counter() - start
+        print_phases(f"Warm renders ({renders} boards, {len(languages)} languages per call)", warm.phases, renders)
+        print(f"\n  {renders / elapsed:.2f} renders/s")
+
+        # Upload encodings of one rendered board
+        sample = os.path.join(out_dir, "cold-0.png")
+        print("\nUpload encodings")
+        for image_format in SCOREBOARD_FORMATS:
+            for max_width in (0, 1280):
+                start = time.perf_counter()
+                data = encode_scoreboard(sample, image_format, max_width)
+                elapsed = time.perf_counter() - start
+                width = max_width or "full"
+                print(f"  {image_format:<6}{width:>6}  {len(data) / 1024:9.1f} KiB  {elapsed * 1000:8.2f} ms")
+
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak RSS: {peak_rss:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()